@@ -1,10 +1,39 @@
+import time
+from typing import AsyncIterator, Optional
 from fastapi import Depends, HTTPException, Request, status
-from app.core.security import verify_access_token
+from starlette.datastructures import FormData, UploadFile
+from starlette.formparsers import FormParser, MultiPartException, MultiPartParser, parse_options_header
+from app.core.config import settings
+from app.core.security import decode_access_token
 from app.db.database import get_db
-from app.schemas.user import UserInDB
+from app.utils.cache import TTLCache
+from app.utils.storage import SNIFF_BYTES, sniff_image_type
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 
+# Steady-state authenticated requests are served from these without touching Mongo.
+# token -> userId, never kept past the token's own expiry
+token_cache = TTLCache(settings.user_cache_max_entries, settings.user_cache_ttl_seconds)
+# userId -> user document, dropped by invalidate_user() on every write that mutates a user
+user_cache = TTLCache(settings.user_cache_max_entries, settings.user_cache_ttl_seconds)
+
+def invalidate_user(*user_ids) -> None:
+    """Evicts cached user documents; call after any write that changes them."""
+    for user_id in user_ids:
+        user_cache.invalidate(str(user_id))
+
+def resolve_token(token: str) -> Optional[str]:
+    """Returns the userId of a valid JWT, caching the result until the token expires."""
+    user_id_str = token_cache.get(token)
+    if user_id_str:
+        return user_id_str
+    payload = decode_access_token(token)
+    if not payload or not payload.get("userId"):
+        return None
+    user_id_str = payload["userId"]
+    token_cache.set(token, user_id_str, ttl_seconds=payload.get("exp", 0) - time.time())
+    return user_id_str
+
 async def get_current_user(request: Request, db: AsyncIOMotorDatabase = Depends(get_db)) -> dict:
     # 1. Extract token from cookie
     token = request.cookies.get("jwt")
@@ -15,7 +44,7 @@ async def get_current_user(request: Request, db: AsyncIOMotorDatabase = Depends(
         )
     
     # 2. Verify token
-    user_id_str = verify_access_token(token)
+    user_id_str = resolve_token(token)
     if not user_id_str:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -23,11 +52,81 @@ async def get_current_user(request: Request, db: AsyncIOMotorDatabase = Depends(
         )
     
     # 3. Find user
-    user = await db["users"].find_one({"_id": ObjectId(user_id_str)})
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
+    user = user_cache.get(user_id_str)
+    if user is None:
+        # An invalidate_user() while find_one is in flight means the result may be stale
+        generation = user_cache.generation
+        # Users migrated from the embedded friend arrays may still carry them; they are never read
+        user = await db["users"].find_one(
+            {"_id": ObjectId(user_id_str)},
+            {"friends": 0, "friendRequests": 0, "sentRequests": 0}
         )
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        user_cache.set(user_id_str, user, generation=generation)
     
-    return user
+    # Shallow copy so a route mutating its user dict cannot corrupt the cached entry
+    return dict(user)
+
+class UploadTooLarge(MultiPartException):
+    pass
+
+async def _capped(stream: AsyncIterator[bytes], limit: int) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > limit:
+            raise UploadTooLarge("Upload is too large.")
+        yield chunk
+
+async def multipart_form(request: Request, current_user: dict = Depends(get_current_user)) -> AsyncIterator[FormData]:
+    """
+    Parses a multipart body for the upload routes, only once the caller is
+    authenticated. The size cap is enforced on the bytes as they arrive, so chunked
+    bodies without a Content-Length are capped too (a declared length over the cap
+    is refused before reading). File parts are spooled to disk by the parser, so
+    memory per request stays constant however large the image is.
+    """
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Upload exceeds the {settings.max_upload_bytes // (1024 * 1024)} MB limit."
+    )
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.max_upload_bytes:
+        raise too_large
+    content_type, _ = parse_options_header(request.headers.get("content-type"))
+    stream = _capped(request.stream(), settings.max_upload_bytes)
+    try:
+        if content_type == b"multipart/form-data":
+            form = await MultiPartParser(request.headers, stream, max_files=1, max_fields=10).parse()
+        elif content_type == b"application/x-www-form-urlencoded":
+            form = await FormParser(request.headers, stream).parse()
+        else:
+            form = FormData()
+    except UploadTooLarge:
+        raise too_large
+    except MultiPartException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.message)
+    try:
+        yield form
+    finally:
+        await form.close()
+
+def form_image(form: FormData, field: str) -> Optional[UploadFile]:
+    """Returns the uploaded file in `field`, if any, enforcing the size cap on what was actually received."""
+    upload = form.get(field)
+    # request.form() yields Starlette's UploadFile, which fastapi.UploadFile only subclasses
+    if not isinstance(upload, UploadFile) or not upload.filename:
+        return None
+    if upload.size is not None and upload.size > settings.max_upload_bytes:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Upload is too large.")
+    return upload
+
+async def validate_image(upload: UploadFile) -> None:
+    """Raises InvalidImage unless the file's leading bytes are an allowed image; run before anything is stored."""
+    head = await upload.read(SNIFF_BYTES)
+    await upload.seek(0)
+    sniff_image_type(head)
@@ -4,14 +4,20 @@ import httpx
 from datetime import datetime
 from bson import ObjectId
 from app.db.database import get_db
-from app.api.deps import get_current_user
+from app.db.user_index import user_index
+from app.api.deps import form_image, get_current_user, invalidate_user, multipart_form, validate_image
 from app.schemas.user import UserCreate, UserLogin, UserResponse, AuthProvider
 from app.core.security import hash_password, verify_password, create_access_token
-from app.utils.cloudinary import upload_image
+from app.utils.storage import InvalidImage
+from app.utils.uploads import upload_pipeline
 from app.core.config import settings
 from app.utils.logger import log
+from app.utils.serialization import BSONJSONResponse
 import urllib.parse
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+from starlette.datastructures import FormData
+from typing import Awaitable, Callable, Optional
 
 router = APIRouter()
 
@@ -22,31 +28,34 @@ async def signup(user_data: UserCreate, response: Response, db: AsyncIOMotorData
     if not user_data.password or len(user_data.password) < 6:
         raise HTTPException(status_code=400, detail="Password must be at least 6 characters.")
         
-    existing_email = await db["users"].find_one({"email": user_data.email})
-    if existing_email:
+    # Friendly errors for the common case; the unique indexes still catch races on insert
+    if await db["users"].find_one({"email": user_data.email}, {"_id": 1}):
         raise HTTPException(status_code=400, detail="Email already exists.")
         
-    existing_username = await db["users"].find_one({"username": user_data.username})
-    if existing_username:
+    if await db["users"].find_one({"username": user_data.username}, {"_id": 1}):
         raise HTTPException(status_code=400, detail="Username already exists. Please choose another.")
         
-    hashed_pwd = hash_password(user_data.password)
+    hashed_pwd = await hash_password(user_data.password)
     
     new_user = {
         "username": user_data.username,
+        "usernameLower": user_data.username.lower(),
         "email": user_data.email,
         "password": hashed_pwd,
         "authProvider": AuthProvider.email.value,
         "profilePic": "",
-        "friends": [],
-        "friendRequests": [],
-        "sentRequests": [],
         "createdAt": datetime.utcnow(),
         "updatedAt": datetime.utcnow()
     }
     
-    result = await db["users"].insert_one(new_user)
+    try:
+        result = await db["users"].insert_one(new_user)
+    except DuplicateKeyError as e:
+        if "email" in (e.details or {}).get("keyPattern", {}):
+            raise HTTPException(status_code=400, detail="Email already exists.")
+        raise HTTPException(status_code=400, detail="Username already exists. Please choose another.")
     new_user_id = result.inserted_id
+    user_index.add(user_data.username, user_data.email)
     
     token = create_access_token(str(new_user_id))
     
@@ -77,7 +86,7 @@ async def login(user_data: UserLogin, response: Response, db: AsyncIOMotorDataba
     if user.get("authProvider") == AuthProvider.google.value and not user.get("password"):
         raise HTTPException(status_code=400, detail="Please sign in with Google.")
         
-    if not verify_password(user_data.password, user.get("password")):
+    if not await verify_password(user_data.password, user.get("password")):
         raise HTTPException(status_code=400, detail="Invalid credentials.")
         
     token = create_access_token(str(user["_id"]))
@@ -115,24 +124,41 @@ async def check_auth(current_user: dict = Depends(get_current_user)):
     }
 
 @router.put("/update-profile")
-async def update_profile(request: Request, response: Response, current_user: dict = Depends(get_current_user), db: AsyncIOMotorDatabase = Depends(get_db)):
+async def update_profile(request: Request, current_user: dict = Depends(get_current_user), db: AsyncIOMotorDatabase = Depends(get_db)):
     body = await request.json()
     profile_pic = body.get("profilePic")
-    username = body.get("username")
-    
+    upload = (lambda: upload_pipeline.upload(profile_pic)) if profile_pic else None
+    return await apply_profile_update(current_user, db, body.get("username"), upload)
+
+@router.put("/update-profile/multipart")
+async def update_profile_multipart(current_user: dict = Depends(get_current_user), form: FormData = Depends(multipart_form), db: AsyncIOMotorDatabase = Depends(get_db)):
+    """Same as update_profile but takes `username` and a `profilePic` file as multipart/form-data."""
+    image = form_image(form, "profilePic")
+    if image:
+        try:
+            await validate_image(image)
+        except InvalidImage as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    upload = (lambda: upload_pipeline.upload_stream(image.file)) if image else None
+    return await apply_profile_update(current_user, db, form.get("username"), upload)
+
+async def apply_profile_update(current_user: dict, db: AsyncIOMotorDatabase, username: Optional[str], upload: Optional[Callable[[], Awaitable[str]]]):
     fields_to_update = {}
     
     if username and username != current_user["username"]:
         username = username.strip()
         if len(username) < 3 or len(username) > 20:
             raise HTTPException(status_code=400, detail="Username must be between 3 and 20 characters.")
-        existing = await db["users"].find_one({"username": username, "_id": {"$ne": current_user["_id"]}})
-        if existing:
+        if await db["users"].find_one({"username": username, "_id": {"$ne": current_user["_id"]}}, {"_id": 1}):
             raise HTTPException(status_code=400, detail="This username is already taken by someone else.")
         fields_to_update["username"] = username
+        fields_to_update["usernameLower"] = username.lower()
         
-    if profile_pic:
-        secure_url = await upload_image(profile_pic)
+    if upload:
+        try:
+            secure_url = await upload()
+        except InvalidImage as e:
+            raise HTTPException(status_code=400, detail=str(e))
         fields_to_update["profilePic"] = secure_url
         
     if not fields_to_update:
@@ -140,15 +166,19 @@ async def update_profile(request: Request, response: Response, current_user: dic
         
     fields_to_update["updatedAt"] = datetime.utcnow()
     
-    await db["users"].update_one({"_id": current_user["_id"]}, {"$set": fields_to_update})
+    try:
+        await db["users"].update_one({"_id": current_user["_id"]}, {"$set": fields_to_update})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="This username is already taken by someone else.")
+    invalidate_user(current_user["_id"])
+    user_index.add(username=fields_to_update.get("username"))
     
-    updated_user = await db["users"].find_one({"_id": current_user["_id"]})
+    updated_user = await db["users"].find_one({"_id": current_user["_id"]}, {"password": 0})
     
     token = create_access_token(str(updated_user["_id"]))
-    response.set_cookie("jwt", value=token, max_age=7 * 24 * 60 * 60, httponly=True, samesite="lax", secure=settings.node_env == "production")
-    
-    updated_user["_id"] = str(updated_user["_id"])
-    return updated_user
+    result = BSONJSONResponse(updated_user)
+    result.set_cookie("jwt", value=token, max_age=7 * 24 * 60 * 60, httponly=True, samesite="lax", secure=settings.node_env == "production")
+    return result
 
 @router.get("/check-username/{username}")
 async def check_username_availability(username: str, current_user: dict = Depends(get_current_user), db: AsyncIOMotorDatabase = Depends(get_db)):
@@ -160,8 +190,7 @@ async def check_username_availability(username: str, current_user: dict = Depend
     if current_user["username"] == username:
         return {"available": True, "message": "This is your current username."}
         
-    existing = await db["users"].find_one({"username": username})
-    if existing:
+    if await db["users"].find_one({"username": username}, {"_id": 1}):
         return {"available": False, "message": "Username is already taken."}
         
     return {"available": True, "message": "Username is available."}
@@ -213,24 +242,25 @@ async def google_callback(code: str, db: AsyncIOMotorDatabase = Depends(get_db))
     
     if not user:
         # Check if username exists, append random if so
-        username_check = await db["users"].find_one({"username": base_username})
-        if username_check:
+        if await db["users"].find_one({"username": base_username}, {"_id": 1}):
             base_username = f"{base_username}_{google_id[:5]}"
             
         new_user = {
             "username": base_username,
+            "usernameLower": base_username.lower(),
             "email": email,
             "googleId": google_id,
             "authProvider": AuthProvider.google.value,
             "profilePic": profile_pic,
-            "friends": [],
-            "friendRequests": [],
-            "sentRequests": [],
             "createdAt": datetime.utcnow(),
             "updatedAt": datetime.utcnow()
         }
-        res = await db["users"].insert_one(new_user)
-        user_id = str(res.inserted_id)
+        try:
+            user_id = str(await insert_google_user(db, new_user, google_id))
+        except DuplicateKeyError:
+            log.error(f"Google signup for {email} collided with an existing user")
+            return RedirectResponse(f"{settings.frontend_url}/login?error=google_auth_processing_error")
+        user_index.add(new_user["username"], email)
     else:
         user_id = str(user["_id"])
         
@@ -238,3 +268,19 @@ async def google_callback(code: str, db: AsyncIOMotorDatabase = Depends(get_db))
     response = RedirectResponse(settings.frontend_url)
     response.set_cookie("jwt", value=token, max_age=7 * 24 * 60 * 60, httponly=True, samesite="lax", secure=settings.node_env == "production")
     return response
+
+async def insert_google_user(db: AsyncIOMotorDatabase, new_user: dict, google_id: str) -> ObjectId:
+    """
+    Inserts a first-time Google user. If the username was taken between the check
+    and the insert (e.g. by a signup on another worker) the suffixed name is used instead.
+    """
+    try:
+        return (await db["users"].insert_one(new_user)).inserted_id
+    except DuplicateKeyError as e:
+        suffix = f"_{google_id[:5]}"
+        if "username" not in (e.details or {}).get("keyPattern", {}) or new_user["username"].endswith(suffix):
+            raise
+    new_user.pop("_id", None)
+    new_user["username"] = new_user["username"] + suffix
+    new_user["usernameLower"] = new_user["username"].lower()
+    return (await db["users"].insert_one(new_user)).inserted_id
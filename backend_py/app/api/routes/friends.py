@@ -1,16 +1,70 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from pydantic import BaseModel
 from bson import ObjectId
 from app.db.database import get_db
 from app.api.deps import get_current_user
+from app.db import friendships
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.utils.logger import log
+from app.utils.pagination import DEFAULT_PAGE_SIZE, InvalidCursor, clamp_limit, decode_key_cursor, encode_key_cursor
+from app.utils.serialization import BSONJSONResponse
+from typing import Optional
+import re
 
 router = APIRouter()
 
+SEARCH_MAX_RESULTS = 20
+
 class FriendRequestInput(BaseModel):
     identifier: str
 
+@router.get("/search")
+async def search_users(
+    q: str = Query(..., min_length=1, max_length=20),
+    cursor: Optional[str] = None,
+    limit: int = 10,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    As-you-type username lookup for adding friends. Case-insensitive prefix match
+    served as an anchored range scan of the usernameLower index, each hit carrying
+    the caller's current relationship with that user (or null).
+    """
+    limit = min(max(limit, 1), SEARCH_MAX_RESULTS)
+    prefix = q.strip().lower()
+    if not prefix:
+        # An empty prefix would match every user
+        raise HTTPException(status_code=400, detail="Search query cannot be blank")
+    
+    # An anchored, case-sensitive regex on the lowercased copy is what lets Mongo bound the index scan
+    query = {"usernameLower": {"$regex": f"^{re.escape(prefix)}"}, "_id": {"$ne": current_user["_id"]}}
+    if cursor:
+        try:
+            last_name, last_id = decode_key_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = {"$and": [query, {"$or": [
+            {"usernameLower": {"$gt": last_name}},
+            {"usernameLower": last_name, "_id": {"$gt": last_id}},
+        ]}]}
+        
+    users = await db["users"].find(
+        query, {"username": 1, "usernameLower": 1, "profilePic": 1}
+    ).sort([("usernameLower", 1), ("_id", 1)]).limit(limit + 1).to_list(length=limit + 1)
+    
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_key_cursor(users[-1]["usernameLower"], users[-1]["_id"])
+        
+    states = await friendships.states_for(db, current_user["_id"], [u["_id"] for u in users]) if users else {}
+    results = [
+        {"_id": u["_id"], "username": u["username"], "profilePic": u.get("profilePic", ""), "state": states.get(u["_id"])}
+        for u in users
+    ]
+    return BSONJSONResponse({"users": results, "next": next_cursor})
+
 @router.post("/request/send")
 async def send_friend_request(req: FriendRequestInput, current_user: dict = Depends(get_current_user), db: AsyncIOMotorDatabase = Depends(get_db)):
     identifier = req.identifier
@@ -30,25 +84,16 @@ async def send_friend_request(req: FriendRequestInput, current_user: dict = Depe
     if str(sender_id) == str(receiver_id):
         raise HTTPException(status_code=400, detail="You cannot send a friend request to yourself.")
         
-    if receiver_id in current_user.get("friends", []):
+    state = await friendships.send_request(db, sender_id, receiver_id)
+    if state == friendships.FRIEND:
         raise HTTPException(status_code=400, detail="You are already friends with this user.")
         
-    if receiver_id in current_user.get("sentRequests", []):
+    if state == friendships.OUTGOING:
         raise HTTPException(status_code=400, detail="Friend request already sent.")
         
-    if receiver_id in current_user.get("friendRequests", []):
+    if state == friendships.INCOMING:
         raise HTTPException(status_code=400, detail="This user has already sent you a friend request.")
         
-    await db["users"].update_one(
-        {"_id": sender_id},
-        {"$push": {"sentRequests": receiver_id}}
-    )
-    
-    await db["users"].update_one(
-        {"_id": receiver_id},
-        {"$push": {"friendRequests": sender_id}}
-    )
-    
     return {"message": "Friend request sent successfully."}
 
 @router.post("/request/accept/{sender_id}")
@@ -58,31 +103,9 @@ async def accept_friend_request(sender_id: str, current_user: dict = Depends(get
     except:
         raise HTTPException(status_code=400, detail="Invalid user ID format.")
         
-    receiver_id = current_user["_id"]
-    
-    sender = await db["users"].find_one({"_id": sender_obj_id})
-    if not sender:
-        raise HTTPException(status_code=404, detail="User not found.")
-        
-    if sender_obj_id not in current_user.get("friendRequests", []):
+    if not await friendships.accept_request(db, current_user["_id"], sender_obj_id):
         raise HTTPException(status_code=400, detail="Friend request not found or already handled.")
         
-    await db["users"].update_one(
-        {"_id": receiver_id},
-        {
-            "$push": {"friends": sender_obj_id},
-            "$pull": {"friendRequests": sender_obj_id}
-        }
-    )
-    
-    await db["users"].update_one(
-        {"_id": sender_obj_id},
-        {
-            "$push": {"friends": receiver_id},
-            "$pull": {"sentRequests": receiver_id}
-        }
-    )
-    
     return {"message": "Friend request accepted."}
 
 @router.post("/request/reject/{sender_id}")
@@ -92,22 +115,9 @@ async def reject_friend_request(sender_id: str, current_user: dict = Depends(get
     except:
         raise HTTPException(status_code=400, detail="Invalid user ID format.")
         
-    receiver_id = current_user["_id"]
-    
-    # Check
-    if sender_obj_id not in current_user.get("friendRequests", []):
+    if not await friendships.reject_request(db, current_user["_id"], sender_obj_id):
         raise HTTPException(status_code=400, detail="Friend request not found or already handled.")
         
-    await db["users"].update_one(
-        {"_id": receiver_id},
-        {"$pull": {"friendRequests": sender_obj_id}}
-    )
-    
-    await db["users"].update_one(
-        {"_id": sender_obj_id},
-        {"$pull": {"sentRequests": receiver_id}}
-    )
-    
     return {"message": "Friend request rejected."}
 
 @router.delete("/remove/{friend_id}")
@@ -117,42 +127,26 @@ async def remove_friend(friend_id: str, current_user: dict = Depends(get_current
     except:
         raise HTTPException(status_code=400, detail="Invalid user ID format.")
         
-    if friend_obj_id not in current_user.get("friends", []):
+    if not await friendships.remove_friend(db, current_user["_id"], friend_obj_id):
         raise HTTPException(status_code=400, detail="This user is not in your friends list.")
         
-    await db["users"].update_one(
-        {"_id": current_user["_id"]},
-        {"$pull": {"friends": friend_obj_id}}
-    )
-    
-    await db["users"].update_one(
-        {"_id": friend_obj_id},
-        {"$pull": {"friends": current_user["_id"]}}
-    )
-    
     return {"message": "Friend removed successfully."}
 
-async def fetch_populated_users(db: AsyncIOMotorDatabase, user_ids: list):
-    if not user_ids:
-        return []
-    users = await db["users"].find(
-        {"_id": {"$in": user_ids}},
-        {"username": 1, "email": 1, "profilePic": 1, "_id": 1}
-    ).to_list(length=1000)
-    
-    # Fix ObjectId stringification
-    for u in users:
-        u["_id"] = str(u["_id"])
-    return users
+async def list_page(db: AsyncIOMotorDatabase, owner: ObjectId, state: str, cursor: Optional[str], limit: int):
+    try:
+        page = await friendships.list_peers(db, owner, state, cursor, clamp_limit(limit))
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return BSONJSONResponse(page)
 
 @router.get("/list")
-async def get_friends(current_user: dict = Depends(get_current_user), db: AsyncIOMotorDatabase = Depends(get_db)):
-    return await fetch_populated_users(db, current_user.get("friends", []))
+async def get_friends(cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE, current_user: dict = Depends(get_current_user), db: AsyncIOMotorDatabase = Depends(get_db)):
+    return await list_page(db, current_user["_id"], friendships.FRIEND, cursor, limit)
 
 @router.get("/requests/pending")
-async def get_pending_requests(current_user: dict = Depends(get_current_user), db: AsyncIOMotorDatabase = Depends(get_db)):
-    return await fetch_populated_users(db, current_user.get("friendRequests", []))
+async def get_pending_requests(cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE, current_user: dict = Depends(get_current_user), db: AsyncIOMotorDatabase = Depends(get_db)):
+    return await list_page(db, current_user["_id"], friendships.INCOMING, cursor, limit)
 
 @router.get("/requests/sent")
-async def get_sent_requests(current_user: dict = Depends(get_current_user), db: AsyncIOMotorDatabase = Depends(get_db)):
-    return await fetch_populated_users(db, current_user.get("sentRequests", []))
+async def get_sent_requests(cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE, current_user: dict = Depends(get_current_user), db: AsyncIOMotorDatabase = Depends(get_db)):
+    return await list_page(db, current_user["_id"], friendships.OUTGOING, cursor, limit)
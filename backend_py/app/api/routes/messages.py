@@ -1,61 +1,165 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from bson import ObjectId
 from app.db.database import get_db
-from app.api.deps import get_current_user
+from app.api.deps import form_image, get_current_user, multipart_form, validate_image
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.schemas.message import MessageCreate
-from app.utils.cloudinary import upload_image
-from app.sockets.socket_app import get_receiver_socket_id, sio
-from datetime import datetime
+from app.services import messages as message_service
+from app.services import search as search_service
+from app.utils.conversation import conversation_id
+from app.utils.serialization import BSONJSONResponse
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, clamp_limit, encode_cursor, keyset_filter
+from app.utils.uploads import upload_pipeline
+from app.utils.workers import WorkerPoolSaturated
+from typing import Optional
+from pymongo.errors import ExecutionTimeout
+from starlette.datastructures import FormData
 
 router = APIRouter()
 
 @router.get("/users")
-async def get_users_for_sidebar(current_user: dict = Depends(get_current_user), db: AsyncIOMotorDatabase = Depends(get_db)):
-    try:
-        users_cursor = db["users"].find(
-            {"_id": {"$ne": current_user["_id"]}},
-            {"password": 0} # hide password
-        )
-        users = await users_cursor.to_list(length=1000)
+async def get_users_for_sidebar(
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    The caller's conversations, most recently active first, each with the other
+    participant's public profile, a last-message preview and the caller's unread count.
+    """
+    my_id = current_user["_id"]
+    limit = clamp_limit(limit)
+    
+    match = {"participants": my_id}
+    if cursor:
+        try:
+            match = {"$and": [match, keyset_filter(cursor, "before", "lastMessageAt", "lastMessage._id")]}
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+            
+    conversations = await db["conversations"].aggregate([
+        {"$match": match},
+        {"$sort": {"lastMessageAt": -1, "lastMessage._id": -1}},
+        {"$limit": limit + 1},
+        {"$set": {"peerId": {"$first": {"$filter": {"input": "$participants", "cond": {"$ne": ["$$this", my_id]}}}}}},
+        {"$lookup": {
+            "from": "users",
+            "localField": "peerId",
+            "foreignField": "_id",
+            "pipeline": [{"$project": {"username": 1, "profilePic": 1}}],
+            "as": "user",
+        }},
+        {"$project": {
+            "_id": 0,
+            "conversationId": "$_id",
+            "user": {"$first": "$user"},
+            "lastMessage": 1,
+            "lastMessageAt": 1,
+            "unread": {"$ifNull": [f"$unread.{my_id}", 0]},
+        }},
+    ]).to_list(length=limit + 1)
+    
+    has_more = len(conversations) > limit
+    conversations = conversations[:limit]
+    next_cursor = None
+    if has_more:
+        last = conversations[-1]
+        next_cursor = encode_cursor(last["lastMessageAt"], last["lastMessage"]["_id"])
         
-        for u in users:
-            u["_id"] = str(u["_id"])
-            if "friends" in u: u["friends"] = [str(fid) for fid in u["friends"]]
-            if "friendRequests" in u: u["friendRequests"] = [str(fid) for fid in u["friendRequests"]]
-            if "sentRequests" in u: u["sentRequests"] = [str(fid) for fid in u["sentRequests"]]
-            if "createdAt" in u: u["createdAt"] = u["createdAt"].isoformat()
-            if "updatedAt" in u: u["updatedAt"] = u["updatedAt"].isoformat()
+    return BSONJSONResponse({"conversations": conversations, "next": next_cursor})
+
+# Declared before /{user_to_chat_id} so "search" is not taken for a user id
+@router.get("/search")
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    with_user: Optional[str] = Query(None, alias="with"),
+    offset: int = Query(0, ge=0),
+    limit: int = 20,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Full-text search over the caller's messages, best matches first, optionally
+    restricted to the conversation `with` one user. Each hit carries a snippet.
+    """
+    conv_id = None
+    if with_user:
+        try:
+            conv_id = conversation_id(current_user["_id"], ObjectId(with_user))
+        except:
+            raise HTTPException(status_code=400, detail="Invalid user ID format.")
             
-        return users
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Internal Server Error")
+    try:
+        page = await search_service.search_messages(db, current_user["_id"], q, conv_id, offset, min(clamp_limit(limit), 50))
+    except ExecutionTimeout:
+        raise HTTPException(status_code=503, detail="Search took too long, try a more specific query.")
+    return BSONJSONResponse(page)
+
+# Declared before /{user_to_chat_id} so "sync" is not taken for a user id
+@router.get("/sync")
+async def sync_messages(
+    after: Optional[str] = None,
+    limit: int = MAX_PAGE_SIZE,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    try:
+        return BSONJSONResponse(await message_service.messages_since(db, current_user["_id"], after, clamp_limit(limit)))
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/{user_to_chat_id}")
-async def get_messages(user_to_chat_id: str, current_user: dict = Depends(get_current_user), db: AsyncIOMotorDatabase = Depends(get_db)):
+async def get_messages(
+    user_to_chat_id: str,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
     try:
         other_id = ObjectId(user_to_chat_id)
     except:
         raise HTTPException(status_code=400, detail="Invalid user ID format.")
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both.")
         
     my_id = current_user["_id"]
+    limit = clamp_limit(limit)
     
-    messages_cursor = db["messages"].find({
-        "$or": [
-            {"senderId": my_id, "receiverId": other_id},
-            {"senderId": other_id, "receiverId": my_id}
-        ]
-    }).sort("createdAt", 1)
+    query = {"conversationId": conversation_id(my_id, other_id)}
+    try:
+        if before:
+            query = {"$and": [query, keyset_filter(before, "before")]}
+        elif after:
+            query = {"$and": [query, keyset_filter(after, "after")]}
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Newest page first unless the client is catching up forwards from a cursor.
+    # One extra document is fetched to know whether another page exists.
+    order = 1 if after else -1
+    messages_cursor = db["messages"].find(query).sort([("createdAt", order), ("_id", order)]).limit(limit + 1)
+    messages = await messages_cursor.to_list(length=limit + 1)
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if not after:
+        messages.reverse()
     
-    messages = await messages_cursor.to_list(length=1000)
-    for m in messages:
-        m["_id"] = str(m["_id"])
-        m["senderId"] = str(m["senderId"])
-        m["receiverId"] = str(m["receiverId"])
-        if "createdAt" in m: m["createdAt"] = m["createdAt"].isoformat()
-        if "updatedAt" in m: m["updatedAt"] = m["updatedAt"].isoformat()
+    # Cursors point at the page edges: 'before' loads older history, 'after' polls for newer messages.
+    # When paging backwards 'before' is only returned while older messages remain.
+    before_cursor = None
+    after_cursor = after
+    if messages:
+        if after or has_more:
+            before_cursor = encode_cursor(messages[0]["createdAt"], messages[0]["_id"])
+        after_cursor = encode_cursor(messages[-1]["createdAt"], messages[-1]["_id"])
+    elif not after and not before:
+        # An empty chat still needs a position to sync from after a reconnect
+        after_cursor = message_service.sync_start_cursor()
         
-    return messages
+    return BSONJSONResponse({"messages": messages, "before": before_cursor, "after": after_cursor, "hasMore": has_more})
 
 @router.post("/send/{receiver_id}")
 async def send_message(receiver_id: str, message_data: MessageCreate, current_user: dict = Depends(get_current_user), db: AsyncIOMotorDatabase = Depends(get_db)):
@@ -64,28 +168,31 @@ async def send_message(receiver_id: str, message_data: MessageCreate, current_us
     except:
         raise HTTPException(status_code=400, detail="Invalid user ID format.")
         
-    image_url = None
-    if message_data.image:
-        image_url = await upload_image(message_data.image)
+    return BSONJSONResponse(await message_service.send_message(db, current_user["_id"], recv_obj_id, message_data.text, message_data.image))
+
+@router.post("/send/{receiver_id}/multipart")
+async def send_message_multipart(receiver_id: str, current_user: dict = Depends(get_current_user), form: FormData = Depends(multipart_form), db: AsyncIOMotorDatabase = Depends(get_db)):
+    """
+    Same as send_message but takes `text` and an `image` file as multipart/form-data,
+    streaming the file to storage instead of carrying it base64-encoded in JSON.
+    """
+    try:
+        recv_obj_id = ObjectId(receiver_id)
+    except:
+        raise HTTPException(status_code=400, detail="Invalid user ID format.")
         
-    new_message = {
-        "senderId": current_user["_id"],
-        "receiverId": recv_obj_id,
-        "text": message_data.text,
-        "image": image_url,
-        "createdAt": datetime.utcnow(),
-        "updatedAt": datetime.utcnow()
-    }
-    
-    result = await db["messages"].insert_one(new_message)
-    new_message["_id"] = str(result.inserted_id)
-    new_message["senderId"] = str(new_message["senderId"])
-    new_message["receiverId"] = str(new_message["receiverId"])
-    new_message["createdAt"] = new_message["createdAt"].isoformat()
-    new_message["updatedAt"] = new_message["updatedAt"].isoformat()
+    image = form_image(form, "image")
+    if image:
+        await validate_image(image)
+        if upload_pipeline.pool.saturated:
+            raise WorkerPoolSaturated("upload worker pool is saturated")
+        
+    new_message = await message_service.store_and_push_message(db, current_user["_id"], recv_obj_id, form.get("text"), bool(image))
     
-    receiver_socket_id = get_receiver_socket_id(receiver_id)
-    if receiver_socket_id:
-        await sio.emit("newMessage", new_message, to=receiver_socket_id)
+    # The spooled file only lives as long as this request, so the upload is awaited here;
+    # the receiver already has the text and gets "imageReady" like with the JSON route.
+    if image:
+        image_url = await message_service.attach_image(db, new_message, upload_pipeline.upload_stream(image.file))
+        new_message.update(image=image_url, imagePending=False, imageFailed=image_url is None)
         
-    return new_message
+    return BSONJSONResponse(new_message)
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
+from typing import Dict, Literal, Optional
 
 class Settings(BaseSettings):
     port: int = Field(5001, validation_alias="PORT")
@@ -12,13 +13,75 @@ class Settings(BaseSettings):
     
     session_secret: str = Field(..., validation_alias="SESSION_SECRET")
     
-    cloudinary_cloud_name: str = Field(..., validation_alias="CLOUDINARY_CLOUD_NAME")
-    cloudinary_api_key: str = Field(..., validation_alias="CLOUDINARY_API_KEY")
-    cloudinary_api_secret: str = Field(..., validation_alias="CLOUDINARY_API_SECRET")
+    cloudinary_cloud_name: str = Field("", validation_alias="CLOUDINARY_CLOUD_NAME")
+    cloudinary_api_key: str = Field("", validation_alias="CLOUDINARY_API_KEY")
+    cloudinary_api_secret: str = Field("", validation_alias="CLOUDINARY_API_SECRET")
+    
+    # "cloudinary" or "local" (files under LOCAL_STORAGE_DIR served at LOCAL_STORAGE_URL)
+    storage_backend: str = Field("cloudinary", validation_alias="STORAGE_BACKEND")
+    local_storage_dir: str = Field("uploads", validation_alias="LOCAL_STORAGE_DIR")
+    local_storage_url: str = Field("/uploads", validation_alias="LOCAL_STORAGE_URL")
+    upload_workers: int = Field(4, validation_alias="UPLOAD_WORKERS")
+    upload_queue: int = Field(64, validation_alias="UPLOAD_QUEUE")
+    # Multipart uploads larger than this are rejected with 413, counted as the body streams in
+    max_upload_bytes: int = Field(10 * 1024 * 1024, validation_alias="MAX_UPLOAD_BYTES")
+    upload_chunk_bytes: int = Field(1024 * 1024, validation_alias="UPLOAD_CHUNK_BYTES")
     
     frontend_url: str = Field("http://localhost:5173", validation_alias="FRONTEND_URL")
     
     node_env: str = Field("development", validation_alias="NODE_ENV")
+    
+    # "direct": insert_one per message. "batched": group-commit inserts, emit once durable.
+    # "emit_first": group-commit inserts, emit before the batch is written.
+    message_write_mode: Literal["direct", "batched", "emit_first"] = Field("direct", validation_alias="MESSAGE_WRITE_MODE")
+    message_batch_window_ms: float = Field(5.0, validation_alias="MESSAGE_BATCH_WINDOW_MS")
+    message_batch_max: int = Field(256, validation_alias="MESSAGE_BATCH_MAX")
+    
+    # Upper bound on a single message search before it is abandoned with a 503
+    message_search_max_time_ms: int = Field(2000, validation_alias="MESSAGE_SEARCH_MAX_TIME_MS")
+    
+    # Redis shared by all nodes for Socket.IO pub/sub and presence; unset runs single-node in memory
+    socketio_redis_url: Optional[str] = Field(None, validation_alias="SOCKETIO_REDIS_URL")
+    # Presence changes within this window reach friends as one batched delta
+    presence_batch_window_ms: int = Field(250, validation_alias="PRESENCE_BATCH_WINDOW_MS")
+    # Read acknowledgements are coalesced in memory and written/notified at this interval
+    read_receipt_flush_ms: int = Field(1000, validation_alias="READ_RECEIPT_FLUSH_MS")
+    
+    # In-process cache of verified tokens and user documents used by get_current_user
+    user_cache_ttl_seconds: float = Field(30.0, validation_alias="USER_CACHE_TTL_SECONDS")
+    user_cache_max_entries: int = Field(10_000, validation_alias="USER_CACHE_MAX_ENTRIES")
+    
+    # Sizing of the in-memory username/email filter used to skip availability lookups
+    user_index_capacity: int = Field(1_000_000, validation_alias="USER_INDEX_CAPACITY")
+    user_index_error_rate: float = Field(0.01, validation_alias="USER_INDEX_ERROR_RATE")
+    
+    # bcrypt threads, and how many hash/verify calls may wait for one before signup/login answer 503
+    password_hash_workers: int = Field(2, validation_alias="PASSWORD_HASH_WORKERS")
+    password_hash_queue: int = Field(32, validation_alias="PASSWORD_HASH_QUEUE")
+    
+    # "json" for production: structured lines written off the event loop, diagnose disabled
+    log_format: str = Field("text", validation_alias="LOG_FORMAT")
+    log_level: str = Field("INFO", validation_alias="LOG_LEVEL")
+    # Fraction of records kept per level, e.g. LOG_SAMPLE_RATES='{"DEBUG": 0.01, "INFO": 0.1}'
+    log_sample_rates: Dict[str, float] = Field({}, validation_alias="LOG_SAMPLE_RATES")
+    # One access record (route, status, latency) per HTTP request
+    log_requests: bool = Field(False, validation_alias="LOG_REQUESTS")
+    
+    # API responses at least this large are gzipped when the client accepts it
+    gzip_min_bytes: int = Field(1024, validation_alias="GZIP_MIN_BYTES")
+    # Serve frontend/dist from memory/precompressed variants; false falls back to plain StaticFiles
+    static_precompressed: bool = Field(True, validation_alias="STATIC_PRECOMPRESSED")
+    
+    # Serve Prometheus metrics on /metrics. Off by default: the endpoint is unauthenticated,
+    # so only enable it where /metrics is not reachable from the public internet
+    metrics_enabled: bool = Field(False, validation_alias="METRICS_ENABLED")
+    
+    # Only report missing indexes at startup instead of building them (e.g. in production, where
+    # `python -m app.db.indexes --create` runs before deploys); missing unique indexes still fail startup
+    mongo_index_verify_only: bool = Field(False, validation_alias="MONGO_INDEX_VERIFY_ONLY")
+    # Refuse to start if a registered route query would do a collection scan; indexes still
+    # being built in the background count as missing, so pair it with the CLI or verify-only mode
+    mongo_index_check_plans: bool = Field(False, validation_alias="MONGO_INDEX_CHECK_PLANS")
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
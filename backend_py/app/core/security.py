@@ -2,18 +2,32 @@ import datetime
 import jwt
 import bcrypt
 from app.core.config import settings
+from app.utils.workers import BoundedWorkerPool
 from typing import Optional, Union
 
-def hash_password(password: str) -> str:
-    """Hashes a password using bcrypt."""
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event loop
+password_pool = BoundedWorkerPool(
+    "bcrypt",
+    max_workers=settings.password_hash_workers,
+    max_queue=settings.password_hash_queue,
+)
+
+def _hash_password(password: str) -> str:
     salt = bcrypt.gensalt(rounds=10)
     hashed = bcrypt.hashpw(password.encode("utf-8"), salt)
     return hashed.decode("utf-8")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verifies a plain password against a bcrypt hash."""
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
 
+async def hash_password(password: str) -> str:
+    """Hashes a password using bcrypt on the password worker pool."""
+    return await password_pool.run(_hash_password, password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verifies a plain password against a bcrypt hash on the password worker pool."""
+    return await password_pool.run(_verify_password, plain_password, hashed_password)
+
 def create_access_token(user_id: Union[str, int]) -> str:
     """Creates a JWT access token valid for 7 days (matches Node implementation)."""
     expire = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=7)
@@ -21,12 +35,16 @@ def create_access_token(user_id: Union[str, int]) -> str:
     encoded_jwt = jwt.encode(to_encode, settings.jwt_secret, algorithm="HS256")
     return encoded_jwt
 
-def verify_access_token(token: str) -> Optional[str]:
-    """Verifies and decodes a JWT token, extracting the userId."""
+def decode_access_token(token: str) -> Optional[dict]:
+    """Verifies a JWT token and returns its payload, or None if it is invalid or expired."""
     try:
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
-        return payload.get("userId")
+        return jwt.decode(token, settings.jwt_secret, algorithms=["HS256"])
     except jwt.ExpiredSignatureError:
         return None
     except jwt.PyJWTError:
         return None
+
+def verify_access_token(token: str) -> Optional[str]:
+    """Verifies and decodes a JWT token, extracting the userId."""
+    payload = decode_access_token(token)
+    return payload.get("userId") if payload else None
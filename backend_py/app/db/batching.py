@@ -0,0 +1,91 @@
+"""
+Group commit for message inserts: concurrent sends within a few milliseconds are
+written with one insert_many (plus one bulk write for their conversation
+summaries) instead of one round trip each.
+"""
+import asyncio
+from typing import Any, Callable, List, Optional, Tuple
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from app.db.conversations import summary_update
+from app.db.message_search import index_messages
+from app.utils.logger import log
+
+class MessageWriteBatcher:
+    def __init__(self, get_db: Callable[[], Any], window_seconds: float, max_batch: int):
+        self.get_db = get_db
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self._batch: List[Tuple[dict, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushing: set = set()
+
+    async def insert(self, message: dict) -> ObjectId:
+        """
+        Queues a message document for the next flush and resolves with its _id once
+        it has been written. The _id is assigned up front, so callers may use it
+        (e.g. to emit) before the write completes.
+        """
+        message.setdefault("_id", ObjectId())
+        future = asyncio.get_running_loop().create_future()
+        self._batch.append((message, future))
+        if len(self._batch) >= self.max_batch:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window_seconds, self._start_flush)
+        return await future
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._batch = self._batch, []
+        if batch:
+            task = asyncio.create_task(self._flush(batch))
+            self._flushing.add(task)
+            task.add_done_callback(self._flushing.discard)
+
+    async def _flush(self, batch: List[Tuple[dict, asyncio.Future]]) -> None:
+        db = self.get_db()
+        docs = [doc for doc, _ in batch]
+        failed = {}
+        try:
+            await db["messages"].insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            failed = {err["index"]: err for err in e.details.get("writeErrors", [])}
+            if not failed:
+                self._fail(batch, e)
+                return
+        except Exception as e:
+            self._fail(batch, e)
+            return
+
+        written = [doc for i, doc in enumerate(docs) if i not in failed]
+        try:
+            # Ordered, so several messages to the same conversation leave the newest as lastMessage
+            if written:
+                await db["conversations"].bulk_write([summary_update(doc) for doc in written], ordered=True)
+        except Exception as e:
+            log.error(f"Conversation summary update failed for {len(written)} messages: {e!r}")
+        if written:
+            await index_messages(db, written)
+
+        for i, (doc, future) in enumerate(batch):
+            if future.done():
+                continue
+            if i in failed:
+                future.set_exception(RuntimeError(f"Message insert failed: {failed[i].get('errmsg')}"))
+            else:
+                future.set_result(doc["_id"])
+
+    @staticmethod
+    def _fail(batch, exc: Exception) -> None:
+        log.error(f"Message batch insert of {len(batch)} documents failed: {exc!r}")
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(exc)
+
+    async def close(self) -> None:
+        self._start_flush()
+        if self._flushing:
+            await asyncio.wait(self._flushing)
@@ -0,0 +1,44 @@
+"""
+Per-conversation summaries kept next to the messages they describe, so the
+sidebar can be rendered from one bounded query instead of scanning messages.
+
+    {
+        "_id": conversationId,
+        "participants": [userId, userId],
+        "lastMessage": {"_id", "senderId", "text", "hasImage", "createdAt"},
+        "lastMessageAt": datetime,
+        "unread": {"<userId>": int},
+    }
+"""
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+def last_message_preview(message: dict) -> dict:
+    return {
+        "_id": message["_id"],
+        "senderId": message["senderId"],
+        "text": (message.get("text") or "")[:100],
+        "hasImage": bool(message.get("image") or message.get("imagePending")),
+        "createdAt": message["createdAt"],
+    }
+
+def summary_update(message: dict) -> UpdateOne:
+    """The upsert that folds a freshly inserted message (raw BSON types) into its conversation summary."""
+    return UpdateOne(
+        {"_id": message["conversationId"]},
+        {
+            "$set": {
+                "participants": sorted([message["senderId"], message["receiverId"]]),
+                "lastMessage": last_message_preview(message),
+                "lastMessageAt": message["createdAt"],
+            },
+            "$inc": {f"unread.{message['receiverId']}": 1},
+            "$setOnInsert": {"createdAt": datetime.utcnow()},
+        },
+        upsert=True,
+    )
+
+async def record_message(db: AsyncIOMotorDatabase, message: dict) -> None:
+    """Updates the conversation summary for a single message."""
+    await db["conversations"].bulk_write([summary_update(message)])
@@ -1,5 +1,6 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.core.config import settings
+from app.utils.instrumentation import MongoCommandMetrics
 from app.utils.logger import log
 
 class Database:
@@ -11,7 +12,8 @@ db_instance = Database()
 async def connect_to_mongo():
     try:
         log.info("Connecting to MongoDB...")
-        db_instance.client = AsyncIOMotorClient(settings.mongodb_uri)
+        listeners = [MongoCommandMetrics()] if settings.metrics_enabled else []
+        db_instance.client = AsyncIOMotorClient(settings.mongodb_uri, event_listeners=listeners)
         # Check connection
         await db_instance.client.admin.command("ping")
         # In the Node.js Mongoose connection, the DB name used is implied by the connection string.
@@ -0,0 +1,167 @@
+"""
+Friend graph stored as directed edges instead of arrays embedded in users.
+Every relationship between two users is a pair of documents, one per side:
+
+    {"owner": userId, "peer": userId, "state": "friend" | "incoming" | "outgoing",
+     "createdAt": datetime, "updatedAt": datetime,
+     "undo": {"token", "state", "createdAt", "updatedAt"}}  # left by accept, see below
+
+so "what is my relationship to X" is a unique-index point lookup and each
+list is an indexed, cursor-paginated range over (owner, state, createdAt, _id).
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError
+from app.utils.pagination import encode_cursor, keyset_filter
+
+FRIEND = "friend"
+INCOMING = "incoming"  # the peer sent the owner a request
+OUTGOING = "outgoing"  # the owner sent the peer a request
+
+async def get_state(db: AsyncIOMotorDatabase, owner: ObjectId, peer: ObjectId) -> Optional[str]:
+    edge = await db["friendships"].find_one({"owner": owner, "peer": peer}, {"state": 1})
+    return edge["state"] if edge else None
+
+def edge(owner: ObjectId, peer: ObjectId, state: str, now: datetime) -> dict:
+    return {"owner": owner, "peer": peer, "state": state, "createdAt": now, "updatedAt": now}
+
+def _pair_filter(a: ObjectId, b: ObjectId) -> dict:
+    return {"$or": [{"owner": a, "peer": b}, {"owner": b, "peer": a}]}
+
+async def _settled(coll, a: ObjectId, b: ObjectId, state_ab: Optional[str], state_ba: Optional[str]) -> bool:
+    """
+    Whether the pair already is in the target states. Two identical transitions racing
+    (a double click) can each apply one side; together they still reach the target.
+    """
+    states = {(e["owner"], e["peer"]): e["state"] async for e in coll.find(_pair_filter(a, b), {"owner": 1, "peer": 1, "state": 1})}
+    return states.get((a, b)) == state_ab and states.get((b, a)) == state_ba
+
+# Transitions are one guarded write on the edge pair whose precondition is each
+# edge's expected state; anything but both edges matching is a lost race. Writes
+# to the two documents are individually atomic, so a transition that only got one
+# side undoes it exactly (every overwritten field restored) unless the pair ended
+# up in the target states anyway. Racing transitions on the same pair (accept vs
+# reject, crossed requests) thus leave a consistent pair: one winner, or neither.
+
+async def send_request(db: AsyncIOMotorDatabase, sender: ObjectId, receiver: ObjectId) -> Optional[str]:
+    """
+    Creates the outgoing/incoming edge pair. Returns None on success, otherwise the
+    relationship that already exists from the sender's side.
+    """
+    coll = db["friendships"]
+    now = datetime.utcnow()
+    edges = [edge(sender, receiver, OUTGOING, now), edge(receiver, sender, INCOMING, now)]
+    try:
+        await coll.insert_many(edges, ordered=False)
+        return None
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != 11000 for err in errors):
+            raise
+        failed = {err["index"] for err in errors}
+    inserted = [doc["_id"] for i, doc in enumerate(edges) if i not in failed]
+    if inserted:
+        if await _settled(coll, sender, receiver, OUTGOING, INCOMING):
+            return None
+        await coll.delete_many({"_id": {"$in": inserted}})
+    # The unique (owner, peer) index rejected one side; report it from the sender's view
+    state = await get_state(db, sender, receiver)
+    if state:
+        return state
+    theirs = await get_state(db, receiver, sender)
+    return {OUTGOING: INCOMING, INCOMING: OUTGOING}.get(theirs, theirs) or INCOMING
+
+async def accept_request(db: AsyncIOMotorDatabase, receiver: ObjectId, sender: ObjectId) -> bool:
+    coll = db["friendships"]
+    now = datetime.utcnow()
+    token = ObjectId()
+    # A pipeline update, so each edge keeps what it overwrote for an exact undo
+    result = await coll.update_many(
+        {"$or": [
+            {"owner": receiver, "peer": sender, "state": INCOMING},
+            {"owner": sender, "peer": receiver, "state": OUTGOING},
+        ]},
+        [{"$set": {
+            "undo": {"token": token, "state": "$state", "createdAt": "$createdAt", "updatedAt": "$updatedAt"},
+            "state": FRIEND, "createdAt": now, "updatedAt": now,
+        }}],
+    )
+    if result.matched_count == 2:
+        return True
+    if result.matched_count == 0:
+        return False
+    if await _settled(coll, receiver, sender, FRIEND, FRIEND):
+        return True
+    await coll.update_many(
+        {**_pair_filter(receiver, sender), "undo.token": token, "state": FRIEND},
+        [{"$set": {"state": "$undo.state", "createdAt": "$undo.createdAt", "updatedAt": "$undo.updatedAt"}}, {"$unset": "undo"}],
+    )
+    return False
+
+async def _delete_pair(db: AsyncIOMotorDatabase, a: ObjectId, b: ObjectId, state_ab: str, state_ba: str) -> bool:
+    coll = db["friendships"]
+    # Read first: a delete cannot return what it removed, and an undo must restore it exactly
+    edges = await coll.find({"$or": [
+        {"owner": a, "peer": b, "state": state_ab},
+        {"owner": b, "peer": a, "state": state_ba},
+    ]}).to_list(length=2)
+    if len(edges) < 2:
+        return False
+    result = await coll.delete_many({"$or": [{"_id": e["_id"], "state": e["state"]} for e in edges]})
+    if result.deleted_count == 2:
+        return True
+    if result.deleted_count == 0:
+        return False
+    if await _settled(coll, a, b, None, None):
+        return True
+    try:
+        await coll.insert_many(edges, ordered=False)
+    except BulkWriteError:
+        # The edge this call did not delete is still there (or was replaced since)
+        pass
+    return False
+
+async def reject_request(db: AsyncIOMotorDatabase, receiver: ObjectId, sender: ObjectId) -> bool:
+    return await _delete_pair(db, receiver, sender, INCOMING, OUTGOING)
+
+async def remove_friend(db: AsyncIOMotorDatabase, owner: ObjectId, friend: ObjectId) -> bool:
+    return await _delete_pair(db, owner, friend, FRIEND, FRIEND)
+
+async def list_peers(db: AsyncIOMotorDatabase, owner: ObjectId, state: str, cursor: Optional[str], limit: int) -> dict:
+    """
+    One page of the owner's peers in `state`, newest relationship first, with the
+    peers' public profiles. Raises InvalidCursor for a malformed cursor.
+    """
+    query = {"owner": owner, "state": state}
+    if cursor:
+        query = {"$and": [query, keyset_filter(cursor, "before")]}
+    edges = await db["friendships"].find(query, {"peer": 1, "createdAt": 1}).sort(
+        [("createdAt", -1), ("_id", -1)]
+    ).limit(limit + 1).to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(edges) > limit:
+        edges = edges[:limit]
+        next_cursor = encode_cursor(edges[-1]["createdAt"], edges[-1]["_id"])
+
+    peer_ids = [e["peer"] for e in edges]
+    users = await db["users"].find(
+        {"_id": {"$in": peer_ids}},
+        {"username": 1, "email": 1, "profilePic": 1, "_id": 1}
+    ).to_list(length=len(peer_ids))
+    by_id = {u["_id"]: u for u in users}
+    return {"users": [by_id[p] for p in peer_ids if p in by_id], "next": next_cursor}
+
+async def states_for(db: AsyncIOMotorDatabase, owner: ObjectId, peers: List[ObjectId]) -> Dict[ObjectId, str]:
+    """The owner's relationship to each of `peers` that has one, in one query."""
+    edges = await db["friendships"].find({"owner": owner, "peer": {"$in": peers}}, {"peer": 1, "state": 1}).to_list(length=len(peers))
+    return {e["peer"]: e["state"] for e in edges}
+
+async def friend_ids_of(db: AsyncIOMotorDatabase, owners: Iterable[ObjectId]) -> Dict[ObjectId, List[ObjectId]]:
+    """Friend ids of several users in one query."""
+    result: Dict[ObjectId, List[ObjectId]] = {}
+    async for e in db["friendships"].find({"owner": {"$in": list(owners)}, "state": FRIEND}, {"owner": 1, "peer": 1}):
+        result.setdefault(e["owner"], []).append(e["peer"])
+    return result
@@ -0,0 +1,268 @@
+"""
+Declarative registry of the indexes every hot query path relies on.
+
+At startup `prepare_indexes` compares the registry with what exists. Missing
+unique indexes are built before serving, since duplicate users and friendship
+edges are only rejected by them; everything else is built by `index_builder` in
+the background so a large collection never holds up startup. In verify-only mode
+nothing is built and missing unique indexes fail startup, as does a unique index
+that cannot be built. The CLI builds everything in the foreground and exits 1 if
+anything is still missing afterwards:
+    python -m app.db.indexes --create
+`verify_query_plans` explains a representative query for each route and fails
+if any of them would fall back to a collection scan:
+    python -m app.db.indexes --check-plans
+"""
+import argparse
+import asyncio
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT
+from pymongo.errors import OperationFailure
+from app.utils.conversation import conversation_id
+from app.utils.logger import log
+
+@dataclass(frozen=True)
+class IndexSpec:
+    collection: str
+    keys: Tuple[Tuple[str, Any], ...]
+    name: str
+    options: Dict[str, Any] = field(default_factory=dict)
+
+@dataclass(frozen=True)
+class QueryPlanCheck:
+    route: str
+    collection: str
+    filter: Dict[str, Any]
+    sort: Optional[Dict[str, int]] = None
+
+INDEXES: List[IndexSpec] = [
+    # Names match the ones Mongoose created for the Node backend so both can share a database
+    IndexSpec("users", (("email", ASCENDING),), "email_1", {"unique": True}),
+    IndexSpec("users", (("username", ASCENDING),), "username_1", {"unique": True}),
+    IndexSpec("users", (("googleId", ASCENDING),), "googleId_1", {"unique": True, "sparse": True}),
+    IndexSpec("users", (("usernameLower", ASCENDING), ("_id", ASCENDING)), "usernameLower_1__id_1"),
+    IndexSpec(
+        "messages",
+        (("conversationId", ASCENDING), ("createdAt", ASCENDING), ("_id", ASCENDING)),
+        "conversationId_createdAt_id",
+    ),
+    IndexSpec(
+        "messages",
+        (("participants", ASCENDING), ("createdAt", ASCENDING), ("_id", ASCENDING)),
+        "participants_createdAt_id",
+    ),
+    IndexSpec(
+        "conversations",
+        (("participants", ASCENDING), ("lastMessageAt", DESCENDING), ("lastMessage._id", DESCENDING)),
+        "participants_lastMessageAt_lastMessageId",
+    ),
+    # The equality prefix keeps each search inside the caller's own entries; it must be single-valued
+    IndexSpec("message_search", (("owner", ASCENDING), ("text", TEXT)), "owner_text"),
+    IndexSpec("message_search", (("owner", ASCENDING), ("messageId", ASCENDING)), "owner_1_messageId_1", {"unique": True}),
+    IndexSpec("friendships", (("owner", ASCENDING), ("peer", ASCENDING)), "owner_1_peer_1", {"unique": True}),
+    IndexSpec(
+        "friendships",
+        (("owner", ASCENDING), ("state", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)),
+        "owner_state_createdAt_id",
+    ),
+]
+
+_sample_a, _sample_b = ObjectId(), ObjectId()
+
+QUERY_PLANS: List[QueryPlanCheck] = [
+    QueryPlanCheck("POST /api/auth/signup, /login", "users", {"email": "probe@example.com"}),
+    QueryPlanCheck("GET /api/auth/check-username", "users", {"username": "probe"}),
+    QueryPlanCheck(
+        "POST /api/friends/request/send", "users",
+        {"$or": [{"username": "probe"}, {"email": "probe"}]},
+    ),
+    QueryPlanCheck(
+        "GET /api/messages/{user_to_chat_id}", "messages",
+        {"conversationId": conversation_id(_sample_a, _sample_b)},
+        {"createdAt": -1, "_id": -1},
+    ),
+    QueryPlanCheck(
+        "GET /api/messages/sync", "messages",
+        {"participants": _sample_a, "createdAt": {"$gt": datetime(2024, 1, 1)}},
+        {"createdAt": 1, "_id": 1},
+    ),
+    QueryPlanCheck(
+        "GET /api/messages/search", "message_search",
+        {"owner": _sample_a, "$text": {"$search": "probe"}},
+    ),
+    QueryPlanCheck(
+        "GET /api/messages/users", "conversations",
+        {"participants": _sample_a},
+        {"lastMessageAt": -1, "lastMessage._id": -1},
+    ),
+    QueryPlanCheck(
+        "GET /api/friends/search", "users",
+        {"usernameLower": {"$regex": "^probe"}},
+        {"usernameLower": 1, "_id": 1},
+    ),
+    QueryPlanCheck("POST /api/friends/request/*", "friendships", {"owner": _sample_a, "peer": _sample_b}),
+    QueryPlanCheck(
+        "GET /api/friends/list, /requests/pending, /requests/sent", "friendships",
+        {"owner": _sample_a, "state": "friend"},
+        {"createdAt": -1, "_id": -1},
+    ),
+]
+
+class IndexVerificationError(RuntimeError):
+    pass
+
+def _key_pattern(keys) -> Tuple[Tuple[str, Any], ...]:
+    return tuple((k, v) for k, v in keys)
+
+def _spec_key_pattern(spec: IndexSpec) -> Tuple[Tuple[str, Any], ...]:
+    # Text indexes report their text fields as the internal _fts/_ftsx keys
+    pattern = []
+    for k, v in spec.keys:
+        if v == TEXT:
+            if ("_fts", "text") not in pattern:
+                pattern += [("_fts", "text"), ("_ftsx", 1)]
+        else:
+            pattern.append((k, v))
+    return tuple(pattern)
+
+async def missing_indexes(db) -> List[IndexSpec]:
+    missing = []
+    existing_by_collection: Dict[str, set] = {}
+    for spec in INDEXES:
+        if spec.collection not in existing_by_collection:
+            info = await db[spec.collection].index_information()
+            existing_by_collection[spec.collection] = {_key_pattern(i["key"]) for i in info.values()}
+        if _spec_key_pattern(spec) not in existing_by_collection[spec.collection]:
+            missing.append(spec)
+    return missing
+
+async def ensure_indexes(db, verify_only: bool = False, collections: Optional[List[str]] = None) -> List[IndexSpec]:
+    """
+    Creates every registered index that does not exist yet. Creation is idempotent;
+    in verify-only mode the missing indexes are logged and returned untouched.
+    """
+    missing = [s for s in await missing_indexes(db) if not collections or s.collection in collections]
+    if not missing:
+        log.info("All registered MongoDB indexes are present.")
+        return []
+    for spec in missing:
+        log.warning(f"Missing index {spec.collection}.{spec.name} on {list(spec.keys)}")
+    if verify_only:
+        return missing
+    await create_indexes(db, missing)
+    return missing
+
+async def create_indexes(db, specs: List[IndexSpec]) -> None:
+    """
+    Builds `specs`, raising IndexVerificationError once all were attempted if a
+    unique one failed: without it duplicates are accepted, so that must not be
+    served. Other failures only cost speed and are logged.
+    """
+    failed_unique = []
+    for spec in specs:
+        try:
+            await db[spec.collection].create_index(list(spec.keys), name=spec.name, background=True, **spec.options)
+            log.info(f"Created index {spec.collection}.{spec.name}")
+        except OperationFailure as e:
+            # e.g. existing duplicate values blocking a unique index
+            log.error(f"Could not create index {spec.collection}.{spec.name}: {e}")
+            if spec.options.get("unique"):
+                failed_unique.append(f"{spec.collection}.{spec.name}")
+    if failed_unique:
+        raise IndexVerificationError(f"Could not build unique indexes: {', '.join(failed_unique)}")
+
+async def prepare_indexes(db, verify_only: bool = False) -> None:
+    """Startup check described above; raises IndexVerificationError if a unique index is absent."""
+    missing = await ensure_indexes(db, verify_only=True)
+    unique = [s for s in missing if s.options.get("unique")]
+    if unique and not verify_only:
+        await create_indexes(db, unique)
+        unique = [s for s in await missing_indexes(db) if s.options.get("unique")]
+    if unique:
+        names = ", ".join(f"{s.collection}.{s.name}" for s in unique)
+        raise IndexVerificationError(f"Unique indexes missing: {names}; run `python -m app.db.indexes --create`")
+    rest = [s for s in missing if not s.options.get("unique")]
+    if rest and not verify_only:
+        index_builder.start(db, rest)
+
+class IndexBuilder:
+    """Builds missing indexes in a background task; queries fall back to scans until it finishes."""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, db, specs: List[IndexSpec]) -> None:
+        self._task = asyncio.create_task(create_indexes(db, specs))
+        self._task.add_done_callback(self._done)
+
+    @staticmethod
+    def _done(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            log.opt(exception=task.exception()).error("Background index build failed")
+
+    async def wait(self) -> None:
+        if self._task:
+            await asyncio.shield(self._task)
+
+    async def close(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+index_builder = IndexBuilder()
+
+def _plan_stages(plan) -> List[str]:
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+async def verify_query_plans(db) -> None:
+    """Raises IndexVerificationError if any registered route query plans a COLLSCAN."""
+    offenders = []
+    for check in QUERY_PLANS:
+        find = {"find": check.collection, "filter": check.filter, "limit": 1}
+        if check.sort:
+            find["sort"] = check.sort
+        explain = await db.command({"explain": find, "verbosity": "queryPlanner"})
+        if "COLLSCAN" in _plan_stages(explain["queryPlanner"]["winningPlan"]):
+            offenders.append(f"{check.route} ({check.collection} {check.filter})")
+    if offenders:
+        raise IndexVerificationError("Collection scans planned for: " + "; ".join(offenders))
+    log.info(f"Verified {len(QUERY_PLANS)} route query plans use indexes.")
+
+async def _main(args) -> int:
+    from app.db.database import connect_to_mongo, close_mongo_connection, get_db
+    await connect_to_mongo()
+    try:
+        missing = await ensure_indexes(get_db(), verify_only=not args.create)
+        if args.create and missing:
+            # Whatever failed to build (and was only logged) is still missing
+            missing = await missing_indexes(get_db())
+        if args.check_plans:
+            await verify_query_plans(get_db())
+    except IndexVerificationError as e:
+        log.error(str(e))
+        return 1
+    finally:
+        await close_mongo_connection()
+    return 1 if missing else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify (and optionally build) the registered MongoDB indexes.")
+    parser.add_argument("--create", action="store_true", help="build missing indexes instead of only reporting them")
+    parser.add_argument("--check-plans", action="store_true", help="fail if any registered route query does a COLLSCAN")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
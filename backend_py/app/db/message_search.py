@@ -0,0 +1,46 @@
+"""
+Search entries for messages, one per participant:
+
+    {"owner": userId, "messageId", "conversationId", "senderId", "receiverId",
+     "text", "createdAt"}
+
+A compound text index cannot have an array field (messages.participants) as
+its prefix, so each user gets their own copy of the searchable text and the
+{owner: 1, text: "text"} index scores only the caller's entries.
+"""
+from typing import Iterable, List
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError
+from app.utils.logger import log
+
+def search_entries(message: dict) -> List[dict]:
+    """Entries for a freshly inserted message (raw BSON types, _id assigned); none without text."""
+    if not message.get("text"):
+        return []
+    return [
+        {
+            "owner": owner,
+            "messageId": message["_id"],
+            "conversationId": message["conversationId"],
+            "senderId": message["senderId"],
+            "receiverId": message["receiverId"],
+            "text": message["text"],
+            "createdAt": message["createdAt"],
+        }
+        for owner in (message["senderId"], message["receiverId"])
+    ]
+
+async def index_messages(db: AsyncIOMotorDatabase, messages: Iterable[dict]) -> None:
+    """
+    Writes search entries after the messages themselves are stored. A failure only
+    costs searchability (backfill-message-search repairs it), never the send.
+    """
+    entries = [entry for message in messages for entry in search_entries(message)]
+    if not entries:
+        return
+    try:
+        await db["message_search"].insert_many(entries, ordered=False)
+    except BulkWriteError as e:
+        log.error(f"Indexing messages for search failed: {e.details.get('writeErrors', [])[:1]}")
+    except Exception as e:
+        log.error(f"Indexing {len(entries)} message search entries failed: {e!r}")
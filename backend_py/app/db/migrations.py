@@ -0,0 +1,153 @@
+"""
+One-off data migrations.
+
+Run from the backend_py directory, in order, e.g.:
+    python -m app.db.migrations backfill-conversation-ids
+    python -m app.db.migrations backfill-conversations
+    python -m app.db.migrations backfill-message-participants
+    python -m app.db.migrations migrate-friend-edges
+    python -m app.db.migrations backfill-username-lower
+    python -m app.db.migrations backfill-message-search
+"""
+import argparse
+import asyncio
+from app.db.database import connect_to_mongo, close_mongo_connection, get_db
+from app.db.indexes import ensure_indexes
+from app.utils.logger import log
+
+# Same string conversation_id() builds in Python, computed server-side so the
+# backfill never has to pull documents into the application.
+CONVERSATION_ID_EXPR = {
+    "$cond": [
+        {"$lt": [{"$toString": "$senderId"}, {"$toString": "$receiverId"}]},
+        {"$concat": [{"$toString": "$senderId"}, ":", {"$toString": "$receiverId"}]},
+        {"$concat": [{"$toString": "$receiverId"}, ":", {"$toString": "$senderId"}]},
+    ]
+}
+
+async def backfill_conversation_ids(db):
+    await ensure_indexes(db, collections=["messages"])
+    result = await db["messages"].update_many(
+        {"conversationId": {"$exists": False}},
+        [{"$set": {"conversationId": CONVERSATION_ID_EXPR}}],
+    )
+    log.info(f"Backfilled conversationId on {result.modified_count} messages")
+
+async def backfill_message_participants(db):
+    await ensure_indexes(db, collections=["messages"])
+    result = await db["messages"].update_many(
+        {"participants": {"$exists": False}},
+        [{"$set": {"participants": ["$senderId", "$receiverId"]}}],
+    )
+    log.info(f"Backfilled participants on {result.modified_count} messages")
+
+async def backfill_conversations(db):
+    """Rebuilds conversation summaries from message history (unread counts start at zero)."""
+    await ensure_indexes(db, collections=["conversations"])
+    await db["messages"].aggregate([
+        {"$sort": {"conversationId": 1, "createdAt": 1, "_id": 1}},
+        {"$group": {
+            "_id": "$conversationId",
+            "senderId": {"$last": "$senderId"},
+            "receiverId": {"$last": "$receiverId"},
+            "lastId": {"$last": "$_id"},
+            "lastText": {"$last": "$text"},
+            "lastImage": {"$last": "$image"},
+            "lastMessageAt": {"$last": "$createdAt"},
+            "createdAt": {"$first": "$createdAt"},
+        }},
+        {"$project": {
+            "participants": {"$cond": [
+                {"$lt": ["$senderId", "$receiverId"]},
+                ["$senderId", "$receiverId"],
+                ["$receiverId", "$senderId"],
+            ]},
+            "lastMessage": {
+                "_id": "$lastId",
+                "senderId": "$senderId",
+                "text": {"$substrCP": [{"$ifNull": ["$lastText", ""]}, 0, 100]},
+                "hasImage": {"$toBool": {"$ifNull": ["$lastImage", False]}},
+                "createdAt": "$lastMessageAt",
+            },
+            "lastMessageAt": 1,
+            "createdAt": 1,
+            "unread": {"$literal": {}},
+        }},
+        {"$merge": {"into": "conversations", "whenMatched": "keepExisting", "whenNotMatched": "insert"}},
+    ], allowDiskUse=True).to_list(length=None)
+    log.info(f"Conversation summaries: {await db['conversations'].count_documents({})}")
+
+async def migrate_friend_edges(db):
+    """
+    Copies the friends/friendRequests/sentRequests arrays embedded in users into
+    friendships edges. Existing edges win, so it is safe to re-run; the arrays are
+    left in place for the Node backend and can be $unset once it is retired.
+    """
+    await ensure_indexes(db, collections=["friendships"])
+    for field, state in (("friends", "friend"), ("friendRequests", "incoming"), ("sentRequests", "outgoing")):
+        await db["users"].aggregate([
+            {"$match": {f"{field}.0": {"$exists": True}}},
+            {"$project": {"peer": f"${field}"}},
+            {"$unwind": "$peer"},
+            {"$project": {
+                "_id": 0,
+                "owner": "$_id",
+                "peer": 1,
+                "state": {"$literal": state},
+                "createdAt": "$$NOW",
+                "updatedAt": "$$NOW",
+            }},
+            {"$merge": {"into": "friendships", "on": ["owner", "peer"], "whenMatched": "keepExisting", "whenNotMatched": "insert"}},
+        ], allowDiskUse=True).to_list(length=None)
+        log.info(f"Migrated {field} -> {state} edges")
+    log.info(f"Friendship edges: {await db['friendships'].count_documents({})}")
+
+async def backfill_username_lower(db):
+    await ensure_indexes(db, collections=["users"])
+    result = await db["users"].update_many(
+        {"usernameLower": {"$exists": False}},
+        [{"$set": {"usernameLower": {"$toLower": "$username"}}}],
+    )
+    log.info(f"Backfilled usernameLower on {result.modified_count} users")
+
+async def backfill_message_search(db):
+    """Builds the per-participant search entries for every message with text; safe to re-run."""
+    await ensure_indexes(db, collections=["message_search"])
+    await db["messages"].aggregate([
+        {"$match": {"text": {"$type": "string", "$ne": ""}}},
+        {"$project": {
+            "_id": 0,
+            "owner": ["$senderId", "$receiverId"],
+            "messageId": "$_id",
+            "conversationId": 1,
+            "senderId": 1,
+            "receiverId": 1,
+            "text": 1,
+            "createdAt": 1,
+        }},
+        {"$unwind": "$owner"},
+        {"$merge": {"into": "message_search", "on": ["owner", "messageId"], "whenMatched": "keepExisting", "whenNotMatched": "insert"}},
+    ], allowDiskUse=True).to_list(length=None)
+    log.info(f"Message search entries: {await db['message_search'].count_documents({})}")
+
+MIGRATIONS = {
+    "backfill-conversation-ids": backfill_conversation_ids,
+    "backfill-conversations": backfill_conversations,
+    "backfill-message-participants": backfill_message_participants,
+    "migrate-friend-edges": migrate_friend_edges,
+    "backfill-username-lower": backfill_username_lower,
+    "backfill-message-search": backfill_message_search,
+}
+
+async def run(name: str):
+    await connect_to_mongo()
+    try:
+        await MIGRATIONS[name](get_db())
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a data migration against MONGODB_URI.")
+    parser.add_argument("migration", choices=sorted(MIGRATIONS))
+    args = parser.parse_args()
+    asyncio.run(run(args.migration))
@@ -0,0 +1,95 @@
+"""
+In-process membership index of taken usernames and emails.
+
+Only a "maybe" is meaningful: a "no" is as fresh as this process, and users
+created by another worker after warm-up are unknown here. Uniqueness checks in
+the auth routes therefore always ask Mongo (backed by the unique indexes, which
+startup refuses to run without); the filter may only skip work where a stale
+"no" is harmless.
+"""
+import asyncio
+from typing import List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure
+from app.core.config import settings
+from app.utils.bloom import BloomFilter
+from app.utils.logger import log
+
+class UserIndex:
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.usernames = BloomFilter(capacity, error_rate)
+        self.emails = BloomFilter(capacity, error_rate)
+        self.ready = False
+        # Replayed into the warmed filters, which replace the ones add() writes to meanwhile
+        self._added_while_warming: List[Tuple[Optional[str], Optional[str]]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def may_have_username(self, username: str) -> bool:
+        return not self.ready or username in self.usernames
+
+    def may_have_email(self, email: str) -> bool:
+        return not self.ready or email in self.emails
+
+    def add(self, username: Optional[str] = None, email: Optional[str] = None) -> None:
+        if not self.ready:
+            self._added_while_warming.append((username, email))
+        if username:
+            self.usernames.add(username)
+        if email:
+            self.emails.add(email)
+
+    async def _fill(self, db: AsyncIOMotorDatabase, hint: bool) -> Tuple[BloomFilter, BloomFilter]:
+        usernames = BloomFilter(self.capacity, self.error_rate)
+        emails = BloomFilter(self.capacity, self.error_rate)
+        for field, target in (("username", usernames), ("email", emails)):
+            # Projected to the unique index alone so the hinted scan is covered by it
+            cursor = db["users"].find({}, {field: 1, "_id": 0})
+            if hint:
+                cursor = cursor.hint(f"{field}_1")
+            async for user in cursor:
+                if user.get(field):
+                    target.add(user[field])
+        return usernames, emails
+
+    async def warm(self, db: AsyncIOMotorDatabase) -> None:
+        # Filled into fresh filters, so a pass that fails partway is discarded rather than counted twice
+        try:
+            usernames, emails = await self._fill(db, hint=True)
+        except OperationFailure as e:
+            # The index may be missing; a collection scan gives the same answer
+            log.warning(f"User index warm-up scanning users without the unique indexes: {e}")
+            usernames, emails = await self._fill(db, hint=False)
+        for username, email in self._added_while_warming:
+            if username:
+                usernames.add(username)
+            if email:
+                emails.add(email)
+        self.usernames, self.emails = usernames, emails
+        self._added_while_warming = []
+        self.ready = True
+        log.info(f"User index warmed with {self.usernames.count} usernames, {self.emails.count} emails")
+        if self.usernames.count > self.usernames.capacity:
+            log.warning("User index is over capacity; raise USER_INDEX_CAPACITY to keep false positives low")
+
+    def start(self, db: AsyncIOMotorDatabase) -> None:
+        """Warms in the background; until then every lookup falls back to the database."""
+        self._task = asyncio.create_task(self.warm(db))
+        self._task.add_done_callback(self._done)
+
+    @staticmethod
+    def _done(task: asyncio.Task) -> None:
+        # Nothing awaits the task until shutdown, so a failure would otherwise go unseen
+        if not task.cancelled() and task.exception() is not None:
+            log.opt(exception=task.exception()).error("User index warm-up failed; lookups keep using the database")
+
+    async def close(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+user_index = UserIndex(settings.user_index_capacity, settings.user_index_error_rate)
@@ -1,28 +1,73 @@
 import os
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 import socketio
 
 from app.core.config import settings
+from app.core.security import password_pool
+from app.api.deps import token_cache, user_cache
 from app.api.routes import auth, messages, friends
-from app.db.database import connect_to_mongo, close_mongo_connection
-from app.sockets.socket_app import sio
-from app.utils.logger import log
+from app.db.database import connect_to_mongo, close_mongo_connection, get_db
+from app.db.indexes import index_builder, prepare_indexes, verify_query_plans
+from app.db.user_index import user_index
+from app.services.messages import message_writer
+from app.sockets.socket_app import presence, presence_batcher, read_receipts, sio
+from app.utils.instrumentation import MetricsMiddleware, loop_lag_monitor, observe_caches
+from app.utils.logger import RequestContextMiddleware, log
+from app.utils.metrics import render_all
+from app.utils.serialization import BSONJSONResponse
+from app.utils.static import APIGZipMiddleware, FrontendFiles
+from app.utils.storage import InvalidImage
+from app.utils.uploads import upload_pipeline
+from app.utils.workers import WorkerPoolSaturated
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup actions
     log.info("Starting up FastAPI application...")
     await connect_to_mongo()
+    # Only unique indexes are built inline; the rest can take minutes on large collections
+    await prepare_indexes(get_db(), verify_only=settings.mongo_index_verify_only)
+    if settings.mongo_index_check_plans:
+        await verify_query_plans(get_db())
+    user_index.start(get_db())
+    await presence.start()
+    await read_receipts.start()
+    if settings.metrics_enabled:
+        loop_lag_monitor.start()
     yield
     # Shutdown actions
     log.info("Shutting down FastAPI application...")
+    await loop_lag_monitor.close()
+    await index_builder.close()
+    await user_index.close()
+    await upload_pipeline.drain()
+    await message_writer.close()
+    await read_receipts.close()
+    await presence_batcher.close()
+    await presence.close()
     await close_mongo_connection()
+    password_pool.shutdown()
+    # Flush records still queued for the background sink
+    await log.complete()
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=BSONJSONResponse)
+
+@app.exception_handler(WorkerPoolSaturated)
+async def worker_pool_saturated_handler(request: Request, exc: WorkerPoolSaturated):
+    log.warning(f"Rejected {request.method} {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server is busy, please try again shortly."},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(InvalidImage)
+async def invalid_image_handler(request: Request, exc: InvalidImage):
+    return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": str(exc)})
 
 # Setup CORS mirroring the Node.js setup
 app.add_middleware(
@@ -33,18 +78,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+    
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        observe_caches({"token": token_cache, "user": user_cache})
+        return PlainTextResponse(render_all(), media_type="text/plain; version=0.0.4")
+
+app.add_middleware(APIGZipMiddleware, minimum_size=settings.gzip_min_bytes, compresslevel=5)
+app.add_middleware(RequestContextMiddleware)
+
 # Include API Routers
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(messages.router, prefix="/api/messages", tags=["messages"])
 app.include_router(friends.router, prefix="/api/friends", tags=["friends"])
 
+# Images stored by the local storage backend are served by the app itself
+if settings.storage_backend == "local":
+    os.makedirs(settings.local_storage_dir, exist_ok=True)
+    app.mount(settings.local_storage_url, StaticFiles(directory=settings.local_storage_dir), name="uploads")
+
 # Merge FastAPI Application with Socket.IO ASGI App
 sio_app = socketio.ASGIApp(sio, other_asgi_app=app)
 
 # Serve frontend build in production
 if settings.node_env == "production":
     frontend_dist = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../frontend/dist"))
-    if os.path.exists(frontend_dist):
+    if os.path.exists(frontend_dist) and settings.static_precompressed:
+        # Unknown paths fall back to the in-memory index.html for client-side routing
+        app.mount("/", FrontendFiles(frontend_dist), name="frontend")
+    elif os.path.exists(frontend_dist):
         app.mount("/", StaticFiles(directory=frontend_dist, html=True), name="frontend")
     
         @app.get("/{full_path:path}")
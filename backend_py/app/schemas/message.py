@@ -14,6 +14,11 @@ class MessageInDB(MessageBase):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     senderId: PyObjectId
     receiverId: PyObjectId
+    conversationId: Optional[str] = None
+    # True until a background upload attaches the image URL
+    imagePending: bool = False
+    # Set once the receiver has acknowledged reading up to this message
+    readAt: Optional[datetime] = None
     createdAt: Optional[datetime] = None
     updatedAt: Optional[datetime] = None
     
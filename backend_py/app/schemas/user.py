@@ -44,9 +44,6 @@ class UserInDB(UserBase):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     password: Optional[str] = None
     profilePic: str = ""
-    friends: List[PyObjectId] = []
-    friendRequests: List[PyObjectId] = []
-    sentRequests: List[PyObjectId] = []
     authProvider: AuthProvider = AuthProvider.email
     googleId: Optional[str] = None
     createdAt: Optional[datetime] = None
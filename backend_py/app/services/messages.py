@@ -0,0 +1,144 @@
+"""
+Message persistence and fan-out shared by the HTTP routes and the socket
+`sendMessage` event, so both paths store, summarise and push identically.
+"""
+from datetime import datetime, timedelta
+from typing import Awaitable, Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.config import settings
+from app.db.batching import MessageWriteBatcher
+from app.db.conversations import record_message
+from app.db.database import get_db
+from app.db.message_search import index_messages
+from app.sockets.server import emit_to_user
+from app.utils.conversation import conversation_id
+from app.utils.logger import log
+from app.utils.pagination import encode_cursor, keyset_filter, position_cursor
+from app.utils.storage import decode_data_uri
+from app.utils.uploads import upload_pipeline
+from app.utils.workers import WorkerPoolSaturated
+
+SYNC_LOOKBACK = timedelta(seconds=5)
+
+# Only used when MESSAGE_WRITE_MODE is "batched" or "emit_first"
+message_writer = MessageWriteBatcher(
+    get_db,
+    window_seconds=settings.message_batch_window_ms / 1000,
+    max_batch=settings.message_batch_max,
+)
+
+async def send_message(db: AsyncIOMotorDatabase, sender_id: ObjectId, receiver_id: ObjectId, text: Optional[str], image: Optional[str]) -> dict:
+    """
+    Stores and pushes a message whose optional image is a base64 data URI.
+    Images are uploaded after the message is stored and pushed, so the text is
+    delivered immediately and clients patch the image in on "imageReady". The image
+    is decoded and checked first, raising InvalidImage before anything is stored.
+    """
+    if image and upload_pipeline.pool.saturated:
+        raise WorkerPoolSaturated("upload worker pool is saturated")
+    if image:
+        # Off the event loop: decoding a multi-megabyte data URI is CPU work
+        await upload_pipeline.pool.run(decode_data_uri, image)
+        
+    new_message = await store_and_push_message(db, sender_id, receiver_id, text, bool(image))
+    
+    if image:
+        upload_pipeline.spawn(attach_image(db, new_message, upload_pipeline.upload(image)))
+        
+    return new_message
+
+async def store_and_push_message(db: AsyncIOMotorDatabase, sender_id: ObjectId, receiver_id: ObjectId, text: Optional[str], image_pending: bool) -> dict:
+    new_message = {
+        "conversationId": conversation_id(sender_id, receiver_id),
+        # Lets one index range answer "everything for this user since X" (see messages_since)
+        "participants": [sender_id, receiver_id],
+        "senderId": sender_id,
+        "receiverId": receiver_id,
+        "text": text,
+        "image": None,
+        "imagePending": image_pending,
+        "createdAt": datetime.utcnow(),
+        "updatedAt": datetime.utcnow()
+    }
+    
+    mode = settings.message_write_mode
+    if mode == "direct":
+        result = await db["messages"].insert_one(new_message)
+        await record_message(db, new_message)
+        await index_messages(db, [new_message])
+        payload = message_payload(new_message, result.inserted_id)
+        await emit_to_user("newMessage", payload, payload["receiverId"])
+    elif mode == "emit_first":
+        # Lowest latency for the receiver; the sender is still only answered once the batch is durable
+        new_message["_id"] = ObjectId()
+        payload = message_payload(new_message, new_message["_id"])
+        await emit_to_user("newMessage", payload, payload["receiverId"])
+        await message_writer.insert(new_message)
+    else:
+        message_id = await message_writer.insert(new_message)
+        payload = message_payload(new_message, message_id)
+        await emit_to_user("newMessage", payload, payload["receiverId"])
+        
+    return payload
+
+def message_payload(message: dict, message_id: ObjectId) -> dict:
+    # A copy, so a document still queued in the write batcher is never mutated.
+    # BSON types are left as-is for BSONJSONResponse and the socket JSON encoder.
+    payload = dict(message)
+    payload["_id"] = message_id
+    return payload
+
+async def attach_image(db: AsyncIOMotorDatabase, message: dict, upload: Awaitable[str]) -> Optional[str]:
+    """Awaits a message's image upload, stores its URL and tells both participants it is ready."""
+    message_id = ObjectId(message["_id"])
+    image_url = None
+    try:
+        image_url = await upload
+    except Exception as e:
+        log.error(f"Image upload for message {message['_id']} failed: {e!r}")
+        await db["messages"].update_one(
+            {"_id": message_id},
+            {"$set": {"imagePending": False, "imageFailed": True, "updatedAt": datetime.utcnow()}}
+        )
+        event, payload = "imageFailed", {"_id": message["_id"]}
+    else:
+        await db["messages"].update_one(
+            {"_id": message_id},
+            {"$set": {"image": image_url, "imagePending": False, "updatedAt": datetime.utcnow()}}
+        )
+        event, payload = "imageReady", {"_id": message["_id"], "image": image_url}
+        
+    for user_id in (message["senderId"], message["receiverId"]):
+        await emit_to_user(event, payload, user_id)
+    return image_url
+
+def sync_start_cursor() -> str:
+    """
+    Where a client with nothing loaded starts syncing. Taken from the server's clock,
+    slightly in the past so messages whose createdAt was stamped just before their
+    (batched) insert landed, or on a worker with a slightly different clock, are not skipped.
+    """
+    return position_cursor(datetime.utcnow() - SYNC_LOOKBACK)
+
+async def messages_since(db: AsyncIOMotorDatabase, user_id: ObjectId, after: Optional[str], limit: int) -> dict:
+    """
+    Messages across all of the user's conversations created after the `after`
+    cursor, oldest first, for clients catching up after a disconnect. Without a
+    cursor only the current position is returned, to start syncing from; a user
+    with no messages yet gets a cursor at the server's clock (see sync_start_cursor).
+    Raises InvalidCursor for a malformed cursor.
+    """
+    sort = [("createdAt", 1), ("_id", 1)]
+    if not after:
+        latest = await db["messages"].find({"participants": user_id}).sort([("createdAt", -1), ("_id", -1)]).limit(1).to_list(length=1)
+        cursor = encode_cursor(latest[0]["createdAt"], latest[0]["_id"]) if latest else sync_start_cursor()
+        return {"messages": [], "cursor": cursor, "hasMore": False}
+        
+    query = {"$and": [{"participants": user_id}, keyset_filter(after, "after")]}
+    messages = await db["messages"].find(query).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    cursor = encode_cursor(messages[-1]["createdAt"], messages[-1]["_id"]) if messages else after
+    
+    return {"messages": messages, "cursor": cursor, "hasMore": has_more}
@@ -0,0 +1,65 @@
+"""
+Message search over the per-user message_search entries (see
+app.db.message_search). Queries always carry the caller's id as the text index's
+equality prefix, so only their own messages are scored, and are capped in time
+and depth so a vague term stays cheap.
+"""
+import re
+from typing import List, Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.config import settings
+
+# Ranked results are paged by offset; beyond this depth the query should be refined instead
+MAX_SEARCH_DEPTH = 200
+SNIPPET_CHARS = 120
+
+def snippet(text: str, terms: List[str], width: int = SNIPPET_CHARS) -> str:
+    """A window of the message centred on the first occurrence of any search term."""
+    if len(text) <= width:
+        return text
+    lowered = text.lower()
+    hits = [i for i in (lowered.find(t) for t in terms) if i >= 0]
+    centre = min(hits) if hits else 0
+    start = max(0, min(centre - width // 3, len(text) - width))
+    end = start + width
+    return ("…" if start > 0 else "") + text[start:end].strip() + ("…" if end < len(text) else "")
+
+async def search_messages(
+    db: AsyncIOMotorDatabase,
+    user_id: ObjectId,
+    q: str,
+    conversation_id: Optional[str],
+    offset: int,
+    limit: int,
+) -> dict:
+    """
+    Ranked page of the user's messages matching `q` (Mongo text search syntax:
+    words, "exact phrases", -excluded), optionally limited to one conversation.
+    Raises pymongo's ExecutionTimeout if the search exceeds its time budget.
+    """
+    query = {"owner": user_id, "$text": {"$search": q}}
+    if conversation_id:
+        query["conversationId"] = conversation_id
+        
+    limit = min(limit, MAX_SEARCH_DEPTH - offset)
+    if limit <= 0:
+        return {"results": [], "next": None}
+    
+    score = {"$meta": "textScore"}
+    docs = await db["message_search"].find(
+        query,
+        {"_id": 0, "score": score, "messageId": 1, "conversationId": 1, "senderId": 1, "receiverId": 1, "text": 1, "createdAt": 1},
+    ).sort([("score", score), ("createdAt", -1)]).skip(offset).limit(limit + 1).max_time_ms(
+        settings.message_search_max_time_ms
+    ).to_list(length=limit + 1)
+    
+    has_more = len(docs) > limit and offset + limit < MAX_SEARCH_DEPTH
+    docs = docs[:limit]
+    
+    terms = [t.lower() for t in re.findall(r"\w+", q)]
+    for doc in docs:
+        doc["_id"] = doc.pop("messageId")
+        doc["snippet"] = snippet(doc.pop("text") or "", terms)
+        
+    return {"results": docs, "next": offset + limit if has_more else None}
@@ -0,0 +1,259 @@
+"""
+Presence backends: who is online, as seen by every node serving Socket.IO.
+
+LocalPresence keeps everything in this process and is what single-node
+deployments and tests use. RedisPresence shares the same view across
+workers and machines; it needs the optional `redis` dependency.
+
+PresenceBatcher turns connect/disconnect churn into per-friend deltas.
+"""
+import asyncio
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+from app.sockets.registry import PresenceRegistry
+from app.utils.logger import log
+
+class PresenceBackend(ABC):
+    """Tracks socket sessions per user. Methods are async so shared backends can do I/O."""
+
+    # Called with users whose presence changed without a connect or disconnect event
+    # on this node (e.g. their node crashed); wired to the PresenceBatcher
+    on_changed: Optional[Callable[[List[str]], None]] = None
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def add(self, user_id: str, sid: str) -> bool:
+        """Registers a session; returns True if the user had no other session on this node."""
+
+    @abstractmethod
+    async def remove(self, sid: str) -> Optional[str]:
+        """Forgets a session and returns the user it belonged to, if any."""
+
+    @abstractmethod
+    async def online_users(self) -> List[str]:
+        ...
+
+    @abstractmethod
+    async def is_online(self, user_id: str) -> bool:
+        ...
+
+    async def filter_online(self, user_ids: Iterable[str]) -> Set[str]:
+        """Returns the subset of user_ids that currently have at least one session."""
+        return {user_id for user_id in user_ids if await self.is_online(user_id)}
+
+class LocalPresence(PresenceBackend):
+    def __init__(self):
+        self.registry = PresenceRegistry()
+
+    async def add(self, user_id: str, sid: str) -> bool:
+        return self.registry.add(user_id, sid)
+
+    async def remove(self, sid: str) -> Optional[str]:
+        record = self.registry.remove(sid)
+        return record.user_id if record else None
+
+    async def online_users(self) -> List[str]:
+        return self.registry.online_users()
+
+    async def is_online(self, user_id: str) -> bool:
+        return self.registry.is_online(user_id)
+
+class RedisPresence(PresenceBackend):
+    """
+    Each node publishes its own sessions as a Redis hash {userId: session count}
+    under `presence:node:<node id>` and registers itself in the `presence:nodes`
+    sorted set, scored by when its heartbeat lapses. Lookups read the live nodes
+    from that set and their hashes in one pipeline. A node whose heartbeat lapsed
+    (e.g. it crashed) is reaped by the first live node to notice: its hash is
+    dropped and its users are passed to `on_changed`, so friends see them go
+    offline unless they are still connected elsewhere.
+    """
+
+    KEY_PREFIX = "presence:node:"
+    NODES_KEY = "presence:nodes"
+
+    # Decrement and delete in one step, so a reconnect on this node between the two is never lost
+    _REMOVE = """
+    local count = redis.call('HINCRBY', KEYS[1], ARGV[1], -1)
+    if count <= 0 then redis.call('HDEL', KEYS[1], ARGV[1]) end
+    return count
+    """
+
+    def __init__(self, url: str, ttl: int = 30):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("SOCKETIO_REDIS_URL is set but the 'redis' package is not installed.") from e
+        self.redis = redis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+        self.node_key = f"{self.KEY_PREFIX}{uuid.uuid4().hex}"
+        self.local = LocalPresence()
+        self._remove = self.redis.register_script(self._REMOVE)
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await self.beat()
+        self._heartbeat = asyncio.create_task(self._beat())
+
+    async def close(self) -> None:
+        if self._heartbeat:
+            self._heartbeat.cancel()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self.NODES_KEY, self.node_key)
+            pipe.delete(self.node_key)
+            await pipe.execute()
+        await self.redis.aclose()
+
+    async def _beat(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                await self.beat()
+            except Exception as e:
+                log.warning(f"Presence heartbeat failed: {e!r}")
+
+    async def beat(self) -> None:
+        """Renews this node's registration and reaps nodes whose heartbeat lapsed."""
+        now = time.time()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(self.NODES_KEY, {self.node_key: now + self.ttl})
+            # Outlives the registration so a reaper can still read which users the node held
+            pipe.expire(self.node_key, self.ttl * 3)
+            added, _ = await pipe.execute()
+        if added:
+            # Newly registered, or reaped after a stall: republish this node's sessions
+            users = await self._publish_local()
+            if users and self.on_changed:
+                self.on_changed(users)
+        for node_key in await self.redis.zrangebyscore(self.NODES_KEY, "-inf", now):
+            await self._reap(node_key)
+
+    async def _publish_local(self) -> List[str]:
+        counts = {user_id: len(self.local.registry.sessions(user_id)) for user_id in self.local.registry.online_users()}
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self.node_key)
+            if counts:
+                pipe.hset(self.node_key, mapping=counts)
+            pipe.expire(self.node_key, self.ttl * 3)
+            await pipe.execute()
+        return list(counts)
+
+    async def _reap(self, node_key: str) -> None:
+        # ZREM succeeds for exactly one reaper, so each dead node is handled once
+        if not await self.redis.zrem(self.NODES_KEY, node_key):
+            return
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hkeys(node_key)
+            pipe.delete(node_key)
+            users, _ = await pipe.execute()
+        log.warning(f"Reaped presence of lapsed node {node_key} ({len(users)} users)")
+        if users and self.on_changed:
+            self.on_changed(users)
+
+    async def add(self, user_id: str, sid: str) -> bool:
+        first = await self.local.add(user_id, sid)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hincrby(self.node_key, user_id, 1)
+            pipe.expire(self.node_key, self.ttl * 3)
+            await pipe.execute()
+        return first
+
+    async def remove(self, sid: str) -> Optional[str]:
+        user_id = await self.local.remove(sid)
+        if user_id:
+            await self._remove(keys=[self.node_key], args=[user_id])
+        return user_id
+
+    async def _node_keys(self) -> List[str]:
+        return await self.redis.zrangebyscore(self.NODES_KEY, time.time(), "+inf")
+
+    async def online_users(self) -> List[str]:
+        node_keys = await self._node_keys()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in node_keys:
+                pipe.hkeys(key)
+            results = await pipe.execute()
+        return list({user_id for users in results for user_id in users})
+
+    async def is_online(self, user_id: str) -> bool:
+        return user_id in await self.filter_online([user_id])
+
+    async def filter_online(self, user_ids: Iterable[str]) -> Set[str]:
+        user_ids = list(user_ids)
+        online = set()
+        if not user_ids:
+            return online
+        node_keys = await self._node_keys()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in node_keys:
+                pipe.hmget(key, user_ids)
+            results = await pipe.execute()
+        for counts in results:
+            online.update(u for u, count in zip(user_ids, counts) if count and int(count) > 0)
+        return online
+
+class PresenceBatcher:
+    """
+    Coalesces presence changes over a short window and sends each online friend
+    one "presenceUpdate" event of the form {"online": [...], "offline": [...]}.
+    A burst of reconnects (e.g. after a deploy) therefore costs one event per
+    recipient instead of a full online-list broadcast to everyone per connection.
+    The state sent is re-read from the backend at flush time, so a user who drops
+    and comes back within the window is simply reported online.
+    """
+
+    def __init__(
+        self,
+        backend: PresenceBackend,
+        friends_of: Callable[[List[str]], Awaitable[Dict[str, List[str]]]],
+        emit: Callable[[str, dict, str], Awaitable[None]],
+        window_seconds: float,
+    ):
+        self.backend = backend
+        self.friends_of = friends_of
+        self.emit = emit
+        self.window_seconds = window_seconds
+        self._pending: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def changed(self, user_id: str) -> None:
+        self._pending.add(user_id)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_after_window())
+
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self.window_seconds)
+        self._flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            log.error(f"Presence flush failed: {e!r}")
+
+    async def flush(self) -> None:
+        changed, self._pending = list(self._pending), set()
+        if not changed:
+            return
+        online = await self.backend.filter_online(changed)
+        friends = await self.friends_of(changed)
+
+        deltas: Dict[str, Dict[str, List[str]]] = defaultdict(lambda: {"online": [], "offline": []})
+        for user_id in changed:
+            state = "online" if user_id in online else "offline"
+            for friend_id in friends.get(user_id, []):
+                deltas[friend_id][state].append(user_id)
+
+        for recipient in await self.backend.filter_online(deltas.keys()):
+            await self.emit("presenceUpdate", deltas[recipient], recipient)
+
+    async def close(self) -> None:
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
@@ -0,0 +1,111 @@
+"""
+Read receipts. Clients acknowledge the newest message they have seen in a
+conversation; acknowledgements are merged in memory to one high-water mark per
+(reader, conversation) and written out periodically as bulk updates, after which
+each sender gets a single "messagesRead" event covering all of their chats.
+"""
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import UpdateMany, UpdateOne
+from app.utils.conversation import conversation_id
+from app.utils.logger import log
+
+RECEIPT_LOOKBACK = timedelta(seconds=5)
+
+class ReadReceiptBuffer:
+    def __init__(
+        self,
+        get_db: Callable[[], Any],
+        emit: Callable[[str, dict, str], Awaitable[None]],
+        flush_interval_seconds: float,
+    ):
+        self.get_db = get_db
+        self.emit = emit
+        self.flush_interval_seconds = flush_interval_seconds
+        self._marks: Dict[Tuple[str, str], datetime] = {} # {(readerId, senderId): read up to}
+        self._task: Optional[asyncio.Task] = None
+
+    def ack(self, reader_id: str, sender_id: str, read_up_to: datetime) -> None:
+        key = (reader_id, sender_id)
+        current = self._marks.get(key)
+        if current is None or read_up_to > current:
+            self._marks[key] = read_up_to
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                log.error(f"Read receipt flush failed: {e!r}")
+
+    async def flush(self) -> None:
+        marks, self._marks = self._marks, {}
+        if not marks:
+            return
+        try:
+            notifications = await self._write(marks)
+        except Exception:
+            # Merged back so the next flush retries them instead of losing the acknowledgements
+            for (reader_id, sender_id), read_up_to in marks.items():
+                self.ack(reader_id, sender_id, read_up_to)
+            raise
+        for sender_id, reads in notifications.items():
+            await self.emit("messagesRead", {"reads": reads}, sender_id)
+
+    async def _write(self, marks: Dict[Tuple[str, str], datetime]) -> Dict[str, List[dict]]:
+        db = self.get_db()
+        now = datetime.utcnow()
+        cids = {key: conversation_id(*key) for key in marks}
+        summaries = {
+            c["_id"]: c
+            async for c in db["conversations"].find({"_id": {"$in": list(set(cids.values()))}}, {"lastReadAt": 1, "lastMessageAt": 1})
+        }
+        message_ops: List = []
+        conversation_ops: List = []
+        notifications: Dict[str, List[dict]] = defaultdict(list)
+
+        for (reader_id, sender_id), read_up_to in marks.items():
+            cid = cids[(reader_id, sender_id)]
+            summary = summaries.get(cid, {})
+            created_at = {"$lte": read_up_to}
+            previous = summary.get("lastReadAt", {}).get(reader_id)
+            if previous is not None:
+                if read_up_to <= previous:
+                    continue
+                # Everything before the previous mark is already read, so only the gap since then is
+                # scanned; the lookback covers messages emitted just before their batched insert landed
+                created_at["$gt"] = previous - RECEIPT_LOOKBACK
+            message_ops.append(UpdateMany(
+                {"conversationId": cid, "receiverId": ObjectId(reader_id), "createdAt": created_at, "readAt": None},
+                {"$set": {"readAt": now}},
+            ))
+            conversation_ops.append(UpdateOne({"_id": cid}, {"$max": {f"lastReadAt.{reader_id}": read_up_to}}))
+            if summary:
+                # Recounted from what is still unread after this mark; skipped if a message arrived
+                # meanwhile, since its $inc would be overwritten (the reader's next ack fixes it)
+                unread = await db["messages"].count_documents(
+                    {"conversationId": cid, "receiverId": ObjectId(reader_id), "createdAt": {"$gt": read_up_to}, "readAt": None}
+                )
+                conversation_ops.append(UpdateOne(
+                    {"_id": cid, "lastMessageAt": summary.get("lastMessageAt")},
+                    {"$set": {f"unread.{reader_id}": unread}},
+                ))
+            notifications[sender_id].append({"userId": reader_id, "readUpTo": read_up_to.isoformat()})
+
+        if message_ops:
+            await db["messages"].bulk_write(message_ops, ordered=False)
+            await db["conversations"].bulk_write(conversation_ops, ordered=False)
+        return notifications
@@ -0,0 +1,54 @@
+import time
+from typing import Dict, List, Optional
+
+class SessionRecord:
+    """One live socket session. Slotted because there is one per connected tab/device."""
+
+    __slots__ = ("sid", "user_id", "connected_at")
+
+    def __init__(self, sid: str, user_id: str, connected_at: float):
+        self.sid = sid
+        self.user_id = user_id
+        self.connected_at = connected_at
+
+class PresenceRegistry:
+    """
+    In-process index of live sessions: user -> {sid: record} plus a sid -> record
+    reverse index, so connect, disconnect and "is this user online" are all O(1)
+    and a user can hold any number of sessions at once.
+    """
+
+    def __init__(self):
+        self._by_user: Dict[str, Dict[str, SessionRecord]] = {}
+        self._by_sid: Dict[str, SessionRecord] = {}
+
+    def add(self, user_id: str, sid: str) -> bool:
+        """Registers a session; returns True if it is the user's first one."""
+        record = SessionRecord(sid, user_id, time.time())
+        self._by_sid[sid] = record
+        sessions = self._by_user.setdefault(user_id, {})
+        sessions[sid] = record
+        return len(sessions) == 1
+
+    def remove(self, sid: str) -> Optional[SessionRecord]:
+        record = self._by_sid.pop(sid, None)
+        if record is None:
+            return None
+        sessions = self._by_user.get(record.user_id)
+        if sessions is not None:
+            sessions.pop(sid, None)
+            if not sessions:
+                del self._by_user[record.user_id]
+        return record
+
+    def sessions(self, user_id: str) -> List[SessionRecord]:
+        return list(self._by_user.get(user_id, {}).values())
+
+    def is_online(self, user_id: str) -> bool:
+        return user_id in self._by_user
+
+    def online_users(self) -> List[str]:
+        return list(self._by_user)
+
+    def __len__(self) -> int:
+        return len(self._by_sid)
@@ -0,0 +1,50 @@
+import socketio
+from socketio import packet
+from typing import Any
+from app.core.config import settings
+from app.utils.instrumentation import socket_emit_bytes, socket_emits
+from app.utils.serialization import SocketJSON
+from app.sockets.presence import LocalPresence, PresenceBackend, RedisPresence
+
+# With a Redis URL, emits and presence are shared by every worker and machine;
+# without one, python-socketio's in-process manager and LocalPresence are used.
+if settings.socketio_redis_url:
+    client_manager = socketio.AsyncRedisManager(settings.socketio_redis_url)
+    presence: PresenceBackend = RedisPresence(settings.socketio_redis_url)
+else:
+    client_manager = None
+    presence = LocalPresence()
+
+class InstrumentedPacket(packet.Packet):
+    """Counts the size of each event packet as python-socketio encodes it, so nothing is serialized twice."""
+
+    def encode(self):
+        encoded = super().encode()
+        if self.packet_type in (packet.EVENT, packet.BINARY_EVENT) and self.data:
+            parts = encoded if isinstance(encoded, list) else [encoded]
+            socket_emit_bytes.inc(self.data[0], amount=sum(len(p) for p in parts))
+        return encoded
+
+class InstrumentedServer(socketio.AsyncServer):
+    """Counts every server-initiated emit per event; sizes are counted by InstrumentedPacket."""
+
+    async def emit(self, event, data=None, *args, **kwargs):
+        socket_emits.inc(event)
+        return await super().emit(event, data, *args, **kwargs)
+
+server_class = InstrumentedServer if settings.metrics_enabled else socketio.AsyncServer
+
+sio = server_class(
+    async_mode='asgi',
+    cors_allowed_origins=["http://localhost:5173", "https://chatty-osx6.onrender.com", "https://shinychat.onrender.com"],
+    client_manager=client_manager,
+    serializer=InstrumentedPacket if settings.metrics_enabled else "default",
+    json=SocketJSON
+)
+
+def user_room(user_id: Any) -> str:
+    return f"user:{user_id}"
+
+async def emit_to_user(event: str, data: Any, user_id: Any) -> None:
+    """Delivers an event to the user's sessions on whichever node they are connected to."""
+    await sio.emit(event, data, to=user_room(user_id))
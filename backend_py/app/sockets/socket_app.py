@@ -1,38 +1,140 @@
-import socketio
-from typing import Dict, Optional
+from datetime import datetime, timezone
+from http.cookies import SimpleCookie
+from bson import ObjectId
+from pydantic import ValidationError
+from typing import Dict, List, Optional
+from app.api.deps import resolve_token
+from app.core.config import settings
+from app.db import friendships
+from app.db.database import get_db
+from app.schemas.message import MessageCreate
+from app.services import messages as message_service
+from app.sockets.presence import PresenceBatcher
+from app.sockets.receipts import ReadReceiptBuffer
+from app.sockets.server import emit_to_user, presence, sio, user_room
+from app.utils.instrumentation import socket_sessions
+from app.utils.pagination import MAX_PAGE_SIZE, InvalidCursor
+from app.utils.storage import InvalidImage
+from app.utils.workers import WorkerPoolSaturated
 
-# Equivalent of maintaining userSocketMap in Node
-user_socket_map: Dict[str, str] = {} # {userId: socketId}
+async def friends_of(user_ids: List[str]) -> Dict[str, List[str]]:
+    """Friend ids of each given user, fetched in one query."""
+    ids = [ObjectId(u) for u in user_ids if ObjectId.is_valid(u)]
+    friends = await friendships.friend_ids_of(get_db(), ids)
+    return {str(owner): [str(f) for f in peers] for owner, peers in friends.items()}
 
-sio = socketio.AsyncServer(
-    async_mode='asgi',
-    cors_allowed_origins=["http://localhost:5173", "https://chatty-osx6.onrender.com", "https://shinychat.onrender.com"]
+presence_batcher = PresenceBatcher(
+    presence,
+    friends_of=friends_of,
+    emit=emit_to_user,
+    window_seconds=settings.presence_batch_window_ms / 1000,
 )
 
-def get_receiver_socket_id(receiver_id: str) -> Optional[str]:
-    return user_socket_map.get(str(receiver_id))
+def report_changed(user_ids: List[str]) -> None:
+    for user_id in user_ids:
+        presence_batcher.changed(user_id)
+
+presence.on_changed = report_changed
+
+read_receipts = ReadReceiptBuffer(
+    get_db,
+    emit=emit_to_user,
+    flush_interval_seconds=settings.read_receipt_flush_ms / 1000,
+)
+
+def authenticate(environ) -> Optional[str]:
+    """Resolves the connecting user from the same `jwt` cookie the HTTP routes use."""
+    cookies = SimpleCookie(environ.get("HTTP_COOKIE", ""))
+    token = cookies.get("jwt")
+    return resolve_token(token.value) if token else None
+
+async def session_user(sid) -> Optional[str]:
+    session = await sio.get_session(sid)
+    return session.get("userId")
 
 @sio.event
 async def connect(sid, environ):
-    # Retrieve query parameters mimicking standard URL search params
-    # In ASGI environ, queries are in QUERY_STRING
-    query_string = environ.get("QUERY_STRING", "")
-    queries = dict(q.split("=") for q in query_string.split("&") if "=" in q)
-    user_id = queries.get("userId")
+    # Authenticated once here; every later event on this connection trusts the session
+    user_id = authenticate(environ)
+    if not user_id:
+        raise ConnectionRefusedError("Unauthorized - Invalid or missing token")
     
-    if user_id:
-        user_socket_map[user_id] = sid
-        # Broadcast online users equivalent to io.emit("getOnlineUsers", ...)
-        await sio.emit("getOnlineUsers", list(user_socket_map.keys()))
+    await sio.save_session(sid, {"userId": user_id})
+    socket_sessions.inc()
+    # Every session joins the user's room, so each tab/device receives their events
+    await sio.enter_room(sid, user_room(user_id))
+    first_session = await presence.add(user_id, sid)
+    # The new session gets a snapshot of its online friends; friends get a batched delta
+    friends = (await friends_of([user_id])).get(user_id, [])
+    await sio.emit("getOnlineUsers", list(await presence.filter_online(friends)), to=sid)
+    if first_session:
+        presence_batcher.changed(user_id)
 
 @sio.event
 async def disconnect(sid):
-    disconnected_user = None
-    for user_id, mapped_sid in list(user_socket_map.items()):
-        if mapped_sid == sid:
-            disconnected_user = user_id
-            del user_socket_map[user_id]
-            break
-
-    if disconnected_user:
-        await sio.emit("getOnlineUsers", list(user_socket_map.keys()))
+    socket_sessions.dec()
+    disconnected_user = await presence.remove(sid)
+
+    # Closing one of several tabs is not a presence change
+    if disconnected_user and not await presence.is_online(disconnected_user):
+        presence_batcher.changed(disconnected_user)
+
+@sio.on("sendMessage")
+async def send_message(sid, data):
+    """
+    Socket equivalent of POST /api/messages/send/{receiver_id}:
+    {"receiverId": ..., "text": ..., "image": <optional data URI>}.
+    The acknowledgement carries {"message": ...} or {"error": ...}.
+    """
+    sender_id = await session_user(sid)
+    if not isinstance(data, dict) or not ObjectId.is_valid(data.get("receiverId")):
+        return {"error": "Invalid user ID format."}
+    try:
+        message_data = MessageCreate(text=data.get("text"), image=data.get("image"))
+    except ValidationError:
+        return {"error": "Malformed message."}
+    if not message_data.text and not message_data.image:
+        return {"error": "Message is empty."}
+    
+    try:
+        message = await message_service.send_message(
+            get_db(), ObjectId(sender_id), ObjectId(data["receiverId"]), message_data.text, message_data.image
+        )
+    except WorkerPoolSaturated:
+        return {"error": "Server is busy, please try again shortly."}
+    except InvalidImage as e:
+        return {"error": str(e)}
+    return {"message": message}
+
+@sio.on("sync")
+async def sync(sid, data):
+    """
+    Socket equivalent of GET /api/messages/sync for a reconnecting client:
+    {"after": <cursor>} acknowledged with {"messages", "cursor", "hasMore"}.
+    """
+    user_id = await session_user(sid)
+    after = data.get("after") if isinstance(data, dict) else None
+    try:
+        return await message_service.messages_since(get_db(), ObjectId(user_id), after, MAX_PAGE_SIZE)
+    except InvalidCursor as e:
+        return {"error": str(e)}
+
+@sio.on("markRead")
+async def mark_read(sid, data):
+    """
+    Client acknowledges having read a conversation up to a message:
+    {"userId": <other participant>, "readUpTo": <that message's createdAt>}.
+    """
+    reader_id = await session_user(sid)
+    if not isinstance(data, dict):
+        return {"error": "Malformed acknowledgement."}
+    try:
+        sender_id = str(ObjectId(data["userId"]))
+        read_up_to = datetime.fromisoformat(data["readUpTo"])
+    except (KeyError, TypeError, ValueError):
+        return {"error": "Malformed acknowledgement."}
+    if read_up_to.tzinfo:
+        # Stored timestamps are naive UTC
+        read_up_to = read_up_to.astimezone(timezone.utc).replace(tzinfo=None)
+    read_receipts.ack(reader_id, sender_id, read_up_to)
+    return {"ok": True}
@@ -0,0 +1,10 @@
+from typing import Union
+from bson import ObjectId
+
+def conversation_id(user_a: Union[str, ObjectId], user_b: Union[str, ObjectId]) -> str:
+    """
+    Canonical identifier of the one-to-one conversation between two users.
+    The pair is sorted so both directions of the chat map to the same key.
+    """
+    low, high = sorted((str(user_a), str(user_b)))
+    return f"{low}:{high}"
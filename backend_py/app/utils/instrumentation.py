@@ -0,0 +1,122 @@
+"""
+Application metrics exposed on /metrics: HTTP latency per route, MongoDB command
+timing per collection, Socket.IO sessions and emits, event-loop lag and the
+in-process caches.
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+from pymongo import monitoring
+from app.utils.cache import TTLCache
+from app.utils.metrics import Counter, Gauge, Histogram
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route")
+)
+http_responses = Counter("http_responses_total", "HTTP responses by route template and status code.", ("method", "route", "status"))
+
+mongo_command_duration = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round trip by collection and command.",
+    ("collection", "command"), buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+mongo_command_failures = Counter("mongodb_command_failures_total", "Failed MongoDB commands.", ("collection", "command"))
+
+socket_sessions = Gauge("socketio_connected_sessions", "Socket.IO sessions connected to this process.")
+socket_emits = Counter("socketio_emits_total", "Socket.IO emits by event.", ("event",))
+socket_emit_bytes = Counter("socketio_emit_payload_bytes_total", "Encoded Socket.IO event packet bytes by event (once per packet encoded, not per recipient).", ("event",))
+
+event_loop_lag = Histogram(
+    "event_loop_lag_seconds", "How late the event loop woke a periodic timer.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+# Sampled from TTLCache.stats() when /metrics is scraped
+cache_entries = Gauge("cache_entries", "Entries held by each in-process cache.", ("cache",))
+cache_hits = Gauge("cache_hits", "Lookups answered by each in-process cache since startup.", ("cache",))
+cache_misses = Gauge("cache_misses", "Lookups each in-process cache could not answer since startup.", ("cache",))
+
+def observe_caches(caches: Dict[str, TTLCache]) -> None:
+    for name, cache in caches.items():
+        stats = cache.stats()
+        cache_entries.set(name, value=stats["entries"])
+        cache_hits.set(name, value=stats["hits"])
+        cache_misses.set(name, value=stats["misses"])
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every HTTP request. Requests are labelled with
+    the matched route template (e.g. /api/messages/{user_to_chat_id}) so the
+    label set stays bounded; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_request_duration.observe(scope["method"], path, value=time.perf_counter() - start)
+            http_responses.inc(scope["method"], path, str(status))
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times each command between its started and succeeded/failed events."""
+
+    def __init__(self):
+        self._collections: Dict[int, str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        self._collections[event.request_id] = target if isinstance(target, str) else "-"
+
+    def _finish(self, event) -> Optional[str]:
+        return self._collections.pop(event.request_id, "-")
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        mongo_command_duration.observe(self._finish(event), event.command_name, value=event.duration_micros / 1e6)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        collection = self._finish(event)
+        mongo_command_duration.observe(collection, event.command_name, value=event.duration_micros / 1e6)
+        mongo_command_failures.inc(collection, event.command_name)
+
+class LoopLagMonitor:
+    """Sleeps for a fixed interval and records how much later than asked it woke up."""
+
+    def __init__(self, interval_seconds: float = 0.5):
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval_seconds)
+            event_loop_lag.observe(value=max(0.0, time.perf_counter() - start - self.interval_seconds))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+loop_lag_monitor = LoopLagMonitor()
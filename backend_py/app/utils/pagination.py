@@ -0,0 +1,61 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(created_at: datetime, doc_id: ObjectId) -> str:
+    """Encodes a (createdAt, _id) keyset position as an opaque URL-safe token."""
+    raw = f"{created_at.isoformat()}|{doc_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Reverses encode_cursor, raising InvalidCursor on anything malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, doc_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|")
+        return datetime.fromisoformat(created_at), ObjectId(doc_id)
+    except (ValueError, InvalidId, UnicodeDecodeError) as e:
+        raise InvalidCursor("Invalid pagination cursor.") from e
+
+def position_cursor(at: datetime) -> str:
+    """A cursor ordered before every document created at or after `at`, for syncing from a point in time."""
+    return encode_cursor(at, ObjectId("0" * 24))
+
+def encode_key_cursor(key: str, doc_id: ObjectId) -> str:
+    """Same as encode_cursor for scans ordered by a string key instead of a timestamp."""
+    raw = f"{key}|{doc_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_key_cursor(cursor: str) -> Tuple[str, ObjectId]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key, doc_id = base64.urlsafe_b64decode(padded).decode("utf-8").rsplit("|", 1)
+        return key, ObjectId(doc_id)
+    except (ValueError, InvalidId, UnicodeDecodeError) as e:
+        raise InvalidCursor("Invalid pagination cursor.") from e
+
+def keyset_filter(cursor: str, direction: str, time_field: str = "createdAt", id_field: str = "_id") -> dict:
+    """
+    Builds the range predicate that continues a (time_field, id_field) ordered scan
+    strictly before ("before") or after ("after") the cursor position.
+    """
+    created_at, doc_id = decode_cursor(cursor)
+    op = "$lt" if direction == "before" else "$gt"
+    return {
+        "$or": [
+            {time_field: {op: created_at}},
+            {time_field: created_at, id_field: {op: doc_id}},
+        ]
+    }
+
+def clamp_limit(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
@@ -0,0 +1,38 @@
+"""
+Fast JSON encoding that understands BSON types, so documents straight from
+Motor can be sent to clients without per-document conversion passes.
+ObjectIds become their hex string and datetimes ISO 8601 strings, exactly as
+the previous hand-written `str()` / `.isoformat()` loops produced.
+"""
+from typing import Any
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default)
+
+class BSONJSONResponse(JSONResponse):
+    """
+    JSON response rendered by orjson. Routes return it directly for document
+    payloads so FastAPI's generic jsonable_encoder pass is skipped entirely.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+class SocketJSON:
+    """`json`-module stand-in for python-socketio so emitted payloads may carry BSON types."""
+
+    @staticmethod
+    def dumps(obj: Any, *args: Any, **kwargs: Any) -> str:
+        return dumps(obj).decode("utf-8")
+
+    @staticmethod
+    def loads(s: Any, *args: Any, **kwargs: Any) -> Any:
+        return orjson.loads(s)
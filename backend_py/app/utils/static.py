@@ -0,0 +1,152 @@
+"""
+Production serving of the built frontend (frontend/dist).
+
+The directory is indexed once at startup, so a request is a dict lookup rather
+than filesystem probing. Files with .br/.gz siblings written by
+`npm run build` (scripts/precompress.js) are served in the best encoding the
+client accepts. Vite's fingerprinted assets are cached as immutable; other
+non-API paths fall back to index.html, which is kept in memory for the SPA routes.
+Misses that name a file (under /assets/ or with an extension) are 404s instead,
+so a stale chunk request fails loudly rather than parsing HTML as JavaScript.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+
+# Preference order when the client accepts several encodings
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+@dataclass
+class StaticEntry:
+    path: str
+    media_type: str
+    etag: str
+    cache_control: str
+    # encoding -> path of the precompressed sibling
+    variants: Dict[str, str] = field(default_factory=dict)
+
+def accepted_encodings(header: str) -> set:
+    """Codings listed in Accept-Encoding without q=0."""
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q=") and q[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+def _etag_for(stat: os.stat_result, suffix: str = "") -> str:
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}{suffix}"'
+
+class FrontendFiles:
+    """ASGI app serving frontend/dist as described above."""
+
+    def __init__(self, directory: str, assets_prefix: str = "/assets/"):
+        self.directory = directory
+        self.assets_prefix = assets_prefix
+        self.entries: Dict[str, StaticEntry] = {}
+        self._scan()
+        self._load_index()
+
+    def _scan(self) -> None:
+        for root, _, files in os.walk(self.directory):
+            names = set(files)
+            for name in files:
+                if any(name.endswith(ext) for _, ext in ENCODINGS):
+                    continue
+                path = os.path.join(root, name)
+                url = "/" + os.path.relpath(path, self.directory).replace(os.sep, "/")
+                media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                cache_control = IMMUTABLE if url.startswith(self.assets_prefix) else REVALIDATE
+                variants = {enc: path + ext for enc, ext in ENCODINGS if name + ext in names}
+                self.entries[url] = StaticEntry(path, media_type, _etag_for(os.stat(path)), cache_control, variants)
+
+    def _load_index(self) -> None:
+        with open(os.path.join(self.directory, "index.html"), "rb") as f:
+            body = f.read()
+        self.index_etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        # encoding -> body, "identity" being the raw file
+        self.index_bodies: Dict[str, bytes] = {"identity": body}
+        for encoding, ext in ENCODINGS:
+            path = os.path.join(self.directory, "index.html" + ext)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    self.index_bodies[encoding] = f.read()
+        if "gzip" not in self.index_bodies:
+            self.index_bodies["gzip"] = gzip.compress(body, 9)
+
+    @staticmethod
+    def _pick(available, accept_encoding: str) -> Optional[str]:
+        accepted = accepted_encodings(accept_encoding)
+        for encoding, _ in ENCODINGS:
+            if encoding in available and (encoding in accepted or "*" in accepted):
+                return encoding
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        # Unknown API paths must stay errors rather than turn into the SPA shell
+        if scope["path"] == "/api" or scope["path"].startswith("/api/"):
+            response = JSONResponse({"detail": "Not Found"}, status_code=404)
+            return await response(scope, receive, send)
+        if scope["method"] not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+            return await response(scope, receive, send)
+
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        accept_encoding = headers.get("accept-encoding", "")
+        entry = self.entries.get(scope["path"])
+        if entry is None and self._names_a_file(scope["path"]):
+            response = PlainTextResponse("Not Found", status_code=404, headers={"Cache-Control": REVALIDATE})
+            return await response(scope, receive, send)
+        if entry is None or scope["path"] == "/index.html":
+            response = self._index_response(accept_encoding, headers.get("if-none-match"))
+        else:
+            response = self._file_response(entry, accept_encoding, headers.get("if-none-match"))
+        await response(scope, receive, send)
+
+    def _names_a_file(self, path: str) -> bool:
+        return path.startswith(self.assets_prefix) or "." in path.rsplit("/", 1)[-1]
+
+    def _file_response(self, entry: StaticEntry, accept_encoding: str, if_none_match: Optional[str]) -> Response:
+        encoding = self._pick(entry.variants, accept_encoding)
+        # Each encoding is a different representation, so it gets its own validator
+        etag = entry.etag if not encoding else entry.etag[:-1] + f"-{encoding}" + '"'
+        response_headers = {"Cache-Control": entry.cache_control, "ETag": etag, "Vary": "Accept-Encoding"}
+        if if_none_match and etag in if_none_match:
+            return Response(status_code=304, headers=response_headers)
+        if encoding:
+            response_headers["Content-Encoding"] = encoding
+            return FileResponse(entry.variants[encoding], media_type=entry.media_type, headers=response_headers)
+        return FileResponse(entry.path, media_type=entry.media_type, headers=response_headers)
+
+    def _index_response(self, accept_encoding: str, if_none_match: Optional[str]) -> Response:
+        encoding = self._pick(self.index_bodies, accept_encoding)
+        etag = self.index_etag if not encoding else self.index_etag[:-1] + f"-{encoding}" + '"'
+        response_headers = {"Cache-Control": REVALIDATE, "ETag": etag, "Vary": "Accept-Encoding"}
+        if if_none_match and etag in if_none_match:
+            return Response(status_code=304, headers=response_headers)
+        if encoding:
+            response_headers["Content-Encoding"] = encoding
+        return Response(self.index_bodies[encoding or "identity"], media_type="text/html", headers=response_headers)
+
+class APIGZipMiddleware(GZipMiddleware):
+    """
+    GZip for API responses only; the frontend is served precompressed and
+    media does not benefit, so neither is compressed again per request.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not scope["path"].startswith("/api/"):
+            return await self.app(scope, receive, send)
+        await super().__call__(scope, receive, send)
@@ -0,0 +1,116 @@
+import base64
+import binascii
+import mimetypes
+import os
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import BinaryIO, Tuple
+from app.core.config import settings
+
+class InvalidImage(ValueError):
+    pass
+
+class StorageBackend(ABC):
+    """
+    Where uploaded images end up. `save` is blocking and is always called from the
+    upload pipeline's worker threads, never from the event loop.
+    """
+
+    @abstractmethod
+    def save(self, image: str) -> str:
+        """Stores an image given as a base64 data URI and returns its public URL."""
+
+    @abstractmethod
+    def save_stream(self, stream: BinaryIO) -> str:
+        """Stores an image read from a file object in chunks and returns its public URL."""
+
+class CloudinaryStorage(StorageBackend):
+    def __init__(self):
+        import cloudinary
+        import cloudinary.uploader
+        cloudinary.config(
+            cloud_name=settings.cloudinary_cloud_name,
+            api_key=settings.cloudinary_api_key,
+            api_secret=settings.cloudinary_api_secret
+        )
+        self._uploader = cloudinary.uploader
+
+    def save(self, image: str) -> str:
+        decode_data_uri(image)  # validation only
+        # Cloudinary handles base64 data URIs natively, just like the Node SDK.
+        result = self._uploader.upload(image, resource_type="image")
+        return result.get("secure_url")
+
+    def save_stream(self, stream: BinaryIO) -> str:
+        sniff_stream(stream)
+        # upload_large sends the file in fixed-size chunks instead of buffering all of it
+        result = self._uploader.upload_large(
+            stream, resource_type="image", chunk_size=max(settings.upload_chunk_bytes, 5 * 1024 * 1024)
+        )
+        return result.get("secure_url")
+
+class LocalStorage(StorageBackend):
+    """Writes images to a local directory served by the app itself; meant for development and tests."""
+
+    def __init__(self, directory: str, base_url: str):
+        self.directory = os.path.abspath(directory)
+        self.base_url = base_url.rstrip("/")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def save(self, image: str) -> str:
+        data, extension = decode_data_uri(image)
+        filename = f"{uuid.uuid4().hex}{extension}"
+        with open(os.path.join(self.directory, filename), "wb") as f:
+            f.write(data)
+        return f"{self.base_url}/{filename}"
+
+    def save_stream(self, stream: BinaryIO) -> str:
+        filename = f"{uuid.uuid4().hex}{mimetypes.guess_extension(sniff_stream(stream)) or ''}"
+        with open(os.path.join(self.directory, filename), "wb") as f:
+            shutil.copyfileobj(stream, f, settings.upload_chunk_bytes)
+        return f"{self.base_url}/{filename}"
+
+# Enough leading bytes to tell the allowed formats apart
+SNIFF_BYTES = 12
+
+def sniff_image_type(head: bytes) -> str:
+    """
+    The image type a file's leading bytes belong to. The client-declared type is
+    never trusted. Raster formats only: SVG can carry script, and LocalStorage
+    serves uploads from the app's own origin.
+    """
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    raise InvalidImage("Only JPEG, PNG, GIF and WebP images are supported.")
+
+def sniff_stream(stream: BinaryIO) -> str:
+    head = stream.read(SNIFF_BYTES)
+    stream.seek(0)
+    return sniff_image_type(head)
+
+def decode_data_uri(image: str) -> Tuple[bytes, str]:
+    """Splits a `data:<mime>;base64,<payload>` string into raw bytes and a file extension."""
+    header, sep, payload = image.partition(",")
+    if not sep or not header.startswith("data:") or not header.endswith(";base64"):
+        raise InvalidImage("Image must be a base64 data URI.")
+    try:
+        data = base64.b64decode(payload, validate=True)
+    except binascii.Error as e:
+        raise InvalidImage("Image is not valid base64.") from e
+    if len(data) > settings.max_upload_bytes:
+        raise InvalidImage(f"Image exceeds the {settings.max_upload_bytes // (1024 * 1024)} MB limit.")
+    return data, mimetypes.guess_extension(sniff_image_type(data[:SNIFF_BYTES])) or ""
+
+@lru_cache(maxsize=1)
+def get_storage() -> StorageBackend:
+    if settings.storage_backend == "local":
+        return LocalStorage(settings.local_storage_dir, settings.local_storage_url)
+    return CloudinaryStorage()
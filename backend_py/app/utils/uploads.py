@@ -0,0 +1,45 @@
+import asyncio
+from typing import BinaryIO, Coroutine, Set
+from app.core.config import settings
+from app.utils.logger import log
+from app.utils.storage import get_storage
+from app.utils.workers import BoundedWorkerPool
+
+class UploadPipeline:
+    """
+    Runs storage uploads concurrently on a bounded thread pool so they never block
+    the event loop, and keeps track of fire-and-forget upload jobs so shutdown can
+    wait for them instead of dropping them.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.pool = BoundedWorkerPool("upload", max_workers=max_workers, max_queue=max_queue)
+        self._jobs: Set[asyncio.Task] = set()
+
+    async def upload(self, image: str) -> str:
+        """Uploads an image to the configured storage backend and returns its URL."""
+        return await self.pool.run(get_storage().save, image)
+
+    async def upload_stream(self, stream: BinaryIO) -> str:
+        """Streams an already-received file to the storage backend and returns its URL."""
+        return await self.pool.run(get_storage().save_stream, stream)
+
+    def spawn(self, job: Coroutine) -> asyncio.Task:
+        """Runs a follow-up job (upload + persist + notify) in the background."""
+        task = asyncio.create_task(job)
+        self._jobs.add(task)
+        task.add_done_callback(self._job_done)
+        return task
+
+    def _job_done(self, task: asyncio.Task) -> None:
+        self._jobs.discard(task)
+        if not task.cancelled() and task.exception():
+            log.error(f"Background upload job failed: {task.exception()!r}")
+
+    async def drain(self, timeout: float = 30.0) -> None:
+        if self._jobs:
+            log.info(f"Waiting for {len(self._jobs)} pending uploads...")
+            await asyncio.wait(self._jobs, timeout=timeout)
+        self.pool.shutdown()
+
+upload_pipeline = UploadPipeline(settings.upload_workers, settings.upload_queue)
@@ -0,0 +1,50 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+class WorkerPoolSaturated(RuntimeError):
+    pass
+
+class BoundedWorkerPool:
+    """
+    Fixed-size thread pool for CPU-heavy calls that release the GIL (e.g. bcrypt),
+    keeping them off the event loop. At most `max_workers` calls run at once and at
+    most `max_queue` more wait for a thread; anything beyond that is rejected
+    immediately with WorkerPoolSaturated instead of piling up latency.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.capacity = max_workers + max_queue
+        self.in_flight = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    @property
+    def saturated(self) -> bool:
+        return self.in_flight >= self.capacity
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.saturated:
+            self.rejected += 1
+            raise WorkerPoolSaturated(f"{self.name} worker pool is saturated")
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        job = self._executor.submit(fn, *args)
+        # Counted until the thread is actually free: a cancelled await leaves the call running
+        job.add_done_callback(lambda _: self._release(loop))
+        return await asyncio.wrap_future(job, loop=loop)
+
+    def _release(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Runs on the worker thread; in_flight is only touched from the loop
+        try:
+            loop.call_soon_threadsafe(self._finished)
+        except RuntimeError:
+            # The loop has closed at shutdown; nothing reads the count any more
+            pass
+
+    def _finished(self) -> None:
+        self.in_flight -= 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
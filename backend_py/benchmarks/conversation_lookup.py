@@ -0,0 +1,101 @@
+"""
+Compares conversation history lookups as the messages collection grows:
+the legacy $or over {senderId, receiverId} pairs vs. a single equality on
+the canonical conversationId.
+
+Needs a disposable MongoDB (the target database is dropped), e.g.:
+    python -m benchmarks.conversation_lookup --uri mongodb://localhost:27017 --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from app.utils.conversation import conversation_id
+
+PAGE = 51
+
+def seed(coll, size: int, users: list, pair: tuple, pair_messages: int):
+    coll.drop()
+    # Both indexes end in the (createdAt, _id) sort key, so neither query pays for a blocking sort
+    coll.create_index([("senderId", ASCENDING), ("receiverId", ASCENDING), ("createdAt", ASCENDING), ("_id", ASCENDING)])
+    coll.create_index([("conversationId", ASCENDING), ("createdAt", ASCENDING), ("_id", ASCENDING)])
+    start = datetime.utcnow() - timedelta(days=365)
+    batch = []
+    # Alternates on its own count; the seeding stride may be even, which would pin one direction
+    seeded = 0
+    for i in range(size):
+        if i % (size // pair_messages or 1) == 0:
+            sender, receiver = pair if seeded % 2 else pair[::-1]
+            seeded += 1
+        else:
+            sender, receiver = random.sample(users, 2)
+        batch.append({
+            "conversationId": conversation_id(sender, receiver),
+            "senderId": sender,
+            "receiverId": receiver,
+            "text": "x" * 32,
+            "createdAt": start + timedelta(seconds=i),
+        })
+        if len(batch) == 10_000:
+            coll.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        coll.insert_many(batch, ordered=False)
+
+def measure(coll, query: dict, repeats: int) -> dict:
+    sort = [("createdAt", DESCENDING), ("_id", DESCENDING)]
+    timings = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        list(coll.find(query).sort(sort).limit(PAGE))
+        timings.append((time.perf_counter() - t0) * 1000)
+    stats = coll.find(query).sort(sort).limit(PAGE).explain()["executionStats"]
+    timings.sort()
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+        "keys_examined": stats["totalKeysExamined"],
+        "docs_examined": stats["totalDocsExamined"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="chat_bench")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="emit machine-readable results")
+    args = parser.parse_args()
+
+    coll = MongoClient(args.uri)[args.db]["messages"]
+    users = [ObjectId() for _ in range(args.users)]
+    a, b = users[0], users[1]
+    legacy = {"$or": [{"senderId": a, "receiverId": b}, {"senderId": b, "receiverId": a}]}
+    keyed = {"conversationId": conversation_id(a, b)}
+
+    results = []
+    for size in args.sizes:
+        seed(coll, size, users, (a, b), pair_messages=500)
+        results.append({
+            "size": size,
+            "legacy_or": measure(coll, legacy, args.repeats),
+            "conversation_id": measure(coll, keyed, args.repeats),
+        })
+    coll.drop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'messages':>10} | {'$or p50':>9} {'p95':>8} {'keys':>6} | {'convId p50':>10} {'p95':>8} {'keys':>6}")
+    for r in results:
+        lo, ck = r["legacy_or"], r["conversation_id"]
+        print(f"{r['size']:>10} | {lo['p50_ms']:>9} {lo['p95_ms']:>8} {lo['keys_examined']:>6} | "
+              f"{ck['p50_ms']:>10} {ck['p95_ms']:>8} {ck['keys_examined']:>6}")
+
+if __name__ == "__main__":
+    main()
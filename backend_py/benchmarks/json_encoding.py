@@ -0,0 +1,79 @@
+"""
+Serializes a page of 1000 message documents (as Motor returns them) the old
+way -- per-document str()/isoformat() pass, FastAPI's jsonable_encoder, then
+stdlib json -- and with BSONJSONResponse's orjson encoder.
+
+    python -m benchmarks.json_encoding --repeats 200
+"""
+import argparse
+import copy
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from app.utils.serialization import dumps
+
+def make_page(size: int) -> list:
+    a, b = ObjectId(), ObjectId()
+    start = datetime.utcnow()
+    page = []
+    for i in range(size):
+        sender, receiver = (a, b) if i % 2 else (b, a)
+        created = start + timedelta(seconds=i)
+        page.append({
+            "_id": ObjectId(),
+            "conversationId": f"{min(str(a), str(b))}:{max(str(a), str(b))}",
+            "participants": [sender, receiver],
+            "senderId": sender,
+            "receiverId": receiver,
+            "text": f"message number {i} with a little bit of text in it",
+            "image": None,
+            "imagePending": False,
+            "createdAt": created,
+            "updatedAt": created,
+        })
+    return page
+
+def legacy(page: list) -> bytes:
+    for m in page:
+        m["_id"] = str(m["_id"])
+        m["senderId"] = str(m["senderId"])
+        m["receiverId"] = str(m["receiverId"])
+        m["participants"] = [str(p) for p in m["participants"]]
+        m["createdAt"] = m["createdAt"].isoformat()
+        m["updatedAt"] = m["updatedAt"].isoformat()
+    body = jsonable_encoder({"messages": page})
+    return json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def current(page: list) -> bytes:
+    return dumps({"messages": page})
+
+def bench(fn, page: list, repeats: int) -> dict:
+    timings = []
+    for _ in range(repeats):
+        # The legacy path mutates its input, so both get a fresh copy outside the timed region
+        data = copy.deepcopy(page)
+        t0 = time.perf_counter()
+        fn(data)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return {"p50_ms": round(statistics.median(timings), 3), "min_ms": round(min(timings), 3)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1000, help="messages per page")
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    page = make_page(args.size)
+    assert json.loads(legacy(copy.deepcopy(page))) == json.loads(current(copy.deepcopy(page)))
+    results = {
+        "page_size": args.size,
+        "legacy_loop_jsonable_encoder": bench(legacy, page, args.repeats),
+        "bson_orjson": bench(current, page, args.repeats),
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Measures /api/messages latency on a running server, first on its own and then
+while a storm of concurrent logins hits /api/auth/login. With bcrypt on the
+password worker pool the history p99 should stay flat across both phases.
+
+    uvicorn app.main:sio_app --port 5001 &
+    python -m benchmarks.login_storm --base-url http://localhost:5001 \
+        --email alice@example.com --password secret123 --peer-id <user id>
+"""
+import argparse
+import asyncio
+import json
+import time
+import httpx
+
+def percentiles(samples: list) -> dict:
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))], 2) if samples else None
+    return {"count": len(samples), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+async def history_probe(client: httpx.AsyncClient, peer_id: str, duration: float, interval: float) -> list:
+    samples = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        res = await client.get(f"/api/messages/{peer_id}")
+        res.raise_for_status()
+        samples.append((time.perf_counter() - t0) * 1000)
+        await asyncio.sleep(interval)
+    return samples
+
+async def login_storm(base_url: str, email: str, password: str, duration: float, concurrency: int) -> dict:
+    statuses = {}
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            while time.perf_counter() < deadline:
+                res = await client.post("/api/auth/login", json={"email": email, "password": password})
+                statuses[res.status_code] = statuses.get(res.status_code, 0) + 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return statuses
+
+async def run(args) -> dict:
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30) as client:
+        res = await client.post("/api/auth/login", json={"email": args.email, "password": args.password})
+        res.raise_for_status()
+
+        idle = await history_probe(client, args.peer_id, args.duration, args.interval)
+        storm_task = asyncio.create_task(
+            login_storm(args.base_url, args.email, args.password, args.duration, args.concurrency)
+        )
+        under_storm = await history_probe(client, args.peer_id, args.duration, args.interval)
+        login_statuses = await storm_task
+
+    return {
+        "history_idle": percentiles(idle),
+        "history_during_login_storm": percentiles(under_storm),
+        "login_status_counts": login_statuses,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:5001")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--peer-id", required=True, help="user id whose conversation history is fetched")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per phase")
+    parser.add_argument("--interval", type=float, default=0.01, help="pause between history requests")
+    parser.add_argument("--concurrency", type=int, default=64, help="concurrent login clients")
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
+
+if __name__ == "__main__":
+    main()
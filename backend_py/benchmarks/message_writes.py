@@ -0,0 +1,88 @@
+"""
+Messages/sec for one worker under each MESSAGE_WRITE_MODE, plus how long it
+takes until the receiver would be pushed the message ("emit") and until the
+sender is answered ("ack"). Every mode runs through
+message_service.store_and_push_message, so it pays the same summary and search
+index writes as production; emits are timed, not sent. The app's settings are
+loaded, so the backend's .env (or environment) must be in place.
+
+Needs a disposable MongoDB (the target database is dropped), e.g.:
+    python -m benchmarks.message_writes --uri mongodb://localhost:27017 --producers 200 --messages 20
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import random
+import time
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.core.config import settings
+from app.db.database import db_instance
+from app.services import messages as message_service
+
+MODES = ("direct", "batched", "emit_first")
+
+# When the current send started; each producer task has its own copy
+_send_started = contextvars.ContextVar("send_started")
+
+def percentile(samples: list, q: float) -> float:
+    samples = sorted(samples)
+    return round(samples[min(len(samples) - 1, int(len(samples) * q))], 3)
+
+async def run_mode(db, mode: str, args, users: list) -> dict:
+    await db["messages"].drop()
+    await db["conversations"].drop()
+    # Every mode goes through the service itself, so each pays exactly what production does
+    settings.message_write_mode = mode
+    writer = message_service.message_writer
+    writer.window_seconds, writer.max_batch = args.window_ms / 1000, args.max_batch
+    emit_ms, ack_ms = [], []
+
+    async def timed_emit(event, payload, user_id):
+        emit_ms.append((time.perf_counter() - _send_started.get()) * 1000)
+    message_service.emit_to_user = timed_emit
+
+    async def producer():
+        for _ in range(args.messages):
+            sender, receiver = random.sample(users, 2)
+            _send_started.set(time.perf_counter())
+            await message_service.store_and_push_message(db, sender, receiver, "benchmark message", False)
+            ack_ms.append((time.perf_counter() - _send_started.get()) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(producer() for _ in range(args.producers)))
+    elapsed = time.perf_counter() - t0
+    await writer.close()
+    return {
+        "mode": mode,
+        "messages": len(ack_ms),
+        "messages_per_sec": round(len(ack_ms) / elapsed, 1),
+        "emit_p50_ms": percentile(emit_ms, 0.50),
+        "emit_p99_ms": percentile(emit_ms, 0.99),
+        "ack_p50_ms": percentile(ack_ms, 0.50),
+        "ack_p99_ms": percentile(ack_ms, 0.99),
+    }
+
+async def main(args):
+    client = AsyncIOMotorClient(args.uri)
+    db = client[args.db]
+    # The batched modes write through the service's batcher, which resolves the database via get_db()
+    db_instance.client, db_instance.db = client, db
+    users = [ObjectId() for _ in range(args.users)]
+    results = [await run_mode(db, mode, args, users) for mode in args.modes]
+    await client.drop_database(args.db)
+    client.close()
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="chat_bench")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--producers", type=int, default=200, help="concurrent senders")
+    parser.add_argument("--messages", type=int, default=20, help="messages per sender")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch", type=int, default=256)
+    asyncio.run(main(parser.parse_args()))
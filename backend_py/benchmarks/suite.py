@@ -0,0 +1,415 @@
+"""
+End-to-end baseline: boots app.main:sio_app under uvicorn against a disposable
+MongoDB, seeds synthetic users, friend graphs and conversations, then drives
+login, history, sidebar, send-message and socket fan-out. Prints one JSON report
+(throughput and p50/p95/p99 per scenario) that can be saved and compared with
+a later commit:
+
+    python -m benchmarks.suite --uri mongodb://localhost:27017/chat_bench --out before.json
+    git checkout <other commit>
+    python -m benchmarks.suite --uri mongodb://localhost:27017/chat_bench --compare before.json
+
+The target database is dropped before seeding. --spawn-mongod runs a throwaway
+mongod from PATH instead. Extra server settings go through --env, e.g.
+--env MESSAGE_WRITE_MODE=batched. The socket scenario needs the Socket.IO
+client extra: pip install "python-socketio[asyncio_client]".
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+import bcrypt
+import httpx
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+PASSWORD = "benchmark"
+SCENARIOS = ("login", "history", "sidebar", "send", "sockets")
+
+def percentiles(samples: list, errors: int, elapsed: float) -> dict:
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))], 2) if samples else None
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_per_sec": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+    }
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+# --- environment -----------------------------------------------------------
+
+def spawn_mongod() -> tuple:
+    if not shutil.which("mongod"):
+        sys.exit("--spawn-mongod needs mongod on PATH")
+    dbpath = tempfile.mkdtemp(prefix="chat-bench-")
+    port = free_port()
+    proc = subprocess.Popen(
+        ["mongod", "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+        stdout=subprocess.DEVNULL,
+    )
+    return proc, dbpath, f"mongodb://127.0.0.1:{port}/chat_bench"
+
+def start_server(uri: str, port: int, extra_env: list) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        MONGODB_URI=uri,
+        JWT_SECRET="benchmark-secret",
+        SESSION_SECRET="benchmark-secret",
+        GOOGLE_CLIENT_ID="unused",
+        GOOGLE_CLIENT_SECRET="unused",
+        GOOGLE_CALLBACK_URL="http://localhost/unused",
+        NODE_ENV="development",
+    )
+    for item in extra_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:sio_app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+
+async def wait_until_up(base_url: str, server: subprocess.Popen, timeout: float = 120.0):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.perf_counter() < deadline:
+            if server.poll() is not None:
+                sys.exit(f"server exited with status {server.returncode}")
+            try:
+                await client.get("/api/auth/check")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.25)
+    sys.exit("server did not come up in time")
+
+# --- seeding ---------------------------------------------------------------
+
+def pair_key(a: ObjectId, b: ObjectId) -> str:
+    # The conversationId format; spelled out so seeding does not depend on the commit under test
+    low, high = sorted((str(a), str(b)))
+    return f"{low}:{high}"
+
+async def seed(uri: str, args) -> list:
+    """
+    Users bench0..N-1 each befriend the next --friends users (a ring) and chat with
+    the first --conversations of them. Everything is self-contained and written in
+    both the legacy shape (friend arrays in users, messages keyed by sender and
+    receiver) and the current one (friendships edges, conversationId/participants
+    on messages, conversation summaries), so any commit can be benchmarked against
+    the same data.
+    """
+    client = AsyncIOMotorClient(uri)
+    db = client.get_default_database()
+    await client.drop_database(db.name)
+
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    now = datetime.utcnow()
+    ids = [ObjectId() for _ in range(args.users)]
+
+    pairs = set()
+    for i in range(args.users):
+        for k in range(1, min(args.friends, args.users - 1) + 1):
+            pairs.add(tuple(sorted((i, (i + k) % args.users))))
+    friends = {user_id: [] for user_id in ids}
+    edges = []
+    for a, b in pairs:
+        for owner, peer in ((ids[a], ids[b]), (ids[b], ids[a])):
+            friends[owner].append(peer)
+            edges.append({"owner": owner, "peer": peer, "state": "friend", "createdAt": now, "updatedAt": now})
+
+    await db["users"].insert_many([
+        {
+            "_id": user_id,
+            "username": f"bench{i}",
+            "usernameLower": f"bench{i}",
+            "email": f"bench{i}@example.com",
+            "password": hashed,
+            "authProvider": "email",
+            "profilePic": "",
+            "friends": friends[user_id],
+            "friendRequests": [],
+            "sentRequests": [],
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        for i, user_id in enumerate(ids)
+    ])
+    for start in range(0, len(edges), 10_000):
+        await db["friendships"].insert_many(edges[start:start + 10_000], ordered=False)
+
+    messages, conversations, chatted = [], [], set()
+    base = now - timedelta(days=30)
+    for i in range(args.users):
+        for k in range(1, min(args.conversations, args.friends) + 1):
+            a, b = ids[i], ids[(i + k) % args.users]
+            key = pair_key(a, b)
+            # On a small ring the same pair comes up from both ends; it is one conversation
+            if a == b or key in chatted:
+                continue
+            chatted.add(key)
+            unread = {str(a): 0, str(b): 0}
+            for m in range(args.messages):
+                sender, receiver = (a, b) if m % 2 == 0 else (b, a)
+                created = base + timedelta(seconds=m, microseconds=random.randrange(1_000_000))
+                messages.append({
+                    "_id": ObjectId(),
+                    "conversationId": key,
+                    "participants": [sender, receiver],
+                    "senderId": sender,
+                    "receiverId": receiver,
+                    "text": f"synthetic message {m} about lorem ipsum {random.randrange(1000)}",
+                    "image": None,
+                    "imagePending": False,
+                    "createdAt": created,
+                    "updatedAt": created,
+                })
+                unread[str(receiver)] += 1
+            # Summarised from the newest message, not the last one generated: createdAt carries jitter
+            last = max(messages[-args.messages:], key=lambda doc: (doc["createdAt"], doc["_id"])) if args.messages else None
+            if last:
+                conversations.append({
+                    "_id": key,
+                    "participants": sorted([a, b]),
+                    "lastMessage": {
+                        "_id": last["_id"],
+                        "senderId": last["senderId"],
+                        "text": last["text"][:100],
+                        "hasImage": False,
+                        "createdAt": last["createdAt"],
+                    },
+                    "lastMessageAt": last["createdAt"],
+                    "unread": unread,
+                    "createdAt": now,
+                })
+            if len(messages) >= 10_000:
+                await db["messages"].insert_many(messages, ordered=False)
+                messages = []
+    if messages:
+        await db["messages"].insert_many(messages, ordered=False)
+    for start in range(0, len(conversations), 10_000):
+        await db["conversations"].insert_many(conversations[start:start + 10_000], ordered=False)
+    client.close()
+    return [str(i) for i in ids]
+
+# --- scenarios -------------------------------------------------------------
+
+async def logged_in_client(base_url: str, index: int) -> httpx.AsyncClient:
+    client = httpx.AsyncClient(base_url=base_url, timeout=30)
+    res = await client.post("/api/auth/login", json={"email": f"bench{index}@example.com", "password": PASSWORD})
+    res.raise_for_status()
+    return client
+
+async def drive(args, clients: list, request) -> dict:
+    """Runs `request(client, worker_index)` in a closed loop on every client for --duration seconds."""
+    samples, errors = [], 0
+    deadline = time.perf_counter() + args.duration
+
+    async def worker(client, index):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                res = await request(client, index)
+                if res.status_code >= 400:
+                    errors += 1
+                    continue
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            samples.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(c, i) for i, c in enumerate(clients)))
+    return percentiles(samples, errors, time.perf_counter() - t0)
+
+def peer_of(args, index: int, users: list) -> str:
+    return users[(index + 1) % args.users]
+
+async def socket_fanout(args, base_url: str, clients: list, users: list) -> dict:
+    """
+    Connects --sockets authenticated clients, then every connected user sends to
+    its first friend over the socket. Reports connect time, sendMessage ack time
+    and send-to-"newMessage" delivery time as seen by the receiving client.
+    """
+    import socketio
+
+    count = min(args.sockets, args.users)
+    sent_at, delivery, acks, connects = {}, [], [], []
+    errors = 0
+    sockets = []
+
+    async def connect(index):
+        nonlocal errors
+        res_client = clients[index] if index < len(clients) else await logged_in_client(base_url, index)
+        sio = socketio.AsyncClient(reconnection=False)
+
+        @sio.on("newMessage")
+        async def on_message(message):
+            t0 = sent_at.pop(message.get("text"), None)
+            if t0 is not None:
+                delivery.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        try:
+            await sio.connect(base_url, headers={"Cookie": f"jwt={res_client.cookies.get('jwt')}"}, transports=["websocket"])
+            connects.append((time.perf_counter() - t0) * 1000)
+            sockets.append((index, sio))
+        except socketio.exceptions.ConnectionError:
+            errors += 1
+        if index >= len(clients):
+            await res_client.aclose()
+
+    for start in range(0, count, 100):
+        await asyncio.gather(*(connect(i) for i in range(start, min(start + 100, count))))
+
+    deadline = time.perf_counter() + args.duration
+
+    async def sender(index, sio):
+        nonlocal errors
+        receiver = peer_of(args, index, users)
+        while time.perf_counter() < deadline:
+            text = f"bench:{uuid.uuid4().hex}"
+            t0 = time.perf_counter()
+            sent_at[text] = t0
+            try:
+                reply = await sio.call("sendMessage", {"receiverId": receiver, "text": text}, timeout=30)
+            except socketio.exceptions.TimeoutError:
+                errors += 1
+                continue
+            if "error" in reply:
+                errors += 1
+            else:
+                acks.append((time.perf_counter() - t0) * 1000)
+            await asyncio.sleep(args.socket_interval)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(sender(i, s) for i, s in sockets))
+    elapsed = time.perf_counter() - t0
+    await asyncio.sleep(1)
+    await asyncio.gather(*(s.disconnect() for _, s in sockets))
+    return {
+        "connected": len(sockets),
+        "connect": percentiles(connects, 0, 0),
+        "send_ack": percentiles(acks, errors, elapsed),
+        "delivery": percentiles(delivery, len(sent_at), elapsed),
+    }
+
+async def run(args, uri: str) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    users = await seed(uri, args)
+    seed_seconds = round(time.perf_counter() - t0, 1)
+
+    server = start_server(uri, port, args.env)
+    try:
+        await wait_until_up(base_url, server)
+        clients = await asyncio.gather(*(logged_in_client(base_url, i) for i in range(min(args.concurrency, args.users))))
+        scenarios = {}
+        if "login" in args.scenarios:
+            scenarios["login"] = await drive(args, clients, lambda c, i: c.post(
+                "/api/auth/login", json={"email": f"bench{i}@example.com", "password": PASSWORD}))
+        if "history" in args.scenarios:
+            scenarios["history"] = await drive(args, clients, lambda c, i: c.get(f"/api/messages/{peer_of(args, i, users)}"))
+        if "sidebar" in args.scenarios:
+            scenarios["sidebar"] = await drive(args, clients, lambda c, i: c.get("/api/messages/users"))
+        if "send" in args.scenarios:
+            scenarios["send"] = await drive(args, clients, lambda c, i: c.post(
+                f"/api/messages/send/{peer_of(args, i, users)}", json={"text": "benchmark message"}))
+        if "sockets" in args.scenarios:
+            scenarios["sockets"] = await socket_fanout(args, base_url, clients, users)
+        await asyncio.gather(*(c.aclose() for c in clients))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "users": args.users,
+            "friends_per_user": args.friends,
+            "conversations_per_user": args.conversations,
+            "messages_per_conversation": args.messages,
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "server_env": args.env,
+            "seed_seconds": seed_seconds,
+        },
+        "scenarios": scenarios,
+    }
+
+def compare(current: dict, baseline: dict) -> dict:
+    """Relative change of every numeric metric present in both reports, e.g. {"history.p99_ms": "+12.5%"}."""
+    def flatten(d, prefix=""):
+        for key, value in d.items():
+            if isinstance(value, dict):
+                yield from flatten(value, f"{prefix}{key}.")
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f"{prefix}{key}", value
+    before = dict(flatten(baseline.get("scenarios", {})))
+    changes = {}
+    for key, value in flatten(current["scenarios"]):
+        if before.get(key):
+            changes[key] = f"{(value - before[key]) / before[key] * 100:+.1f}%"
+    return {"baseline_commit": baseline.get("meta", {}).get("commit"), "changes": changes}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="mongodb://localhost:27017/chat_bench", help="disposable database (dropped!)")
+    parser.add_argument("--spawn-mongod", action="store_true", help="start a temporary mongod instead of using --uri")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--friends", type=int, default=20, help="friends per user")
+    parser.add_argument("--conversations", type=int, default=5, help="conversations per user (<= friends)")
+    parser.add_argument("--messages", type=int, default=200, help="messages per conversation")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent HTTP clients, one user each")
+    parser.add_argument("--sockets", type=int, default=500, help="concurrent Socket.IO clients")
+    parser.add_argument("--socket-interval", type=float, default=0.5, help="pause between each socket's sends")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra server setting")
+    parser.add_argument("--out", help="also write the report to this file")
+    parser.add_argument("--compare", help="baseline report to diff against")
+    args = parser.parse_args()
+
+    mongod, dbpath, uri = spawn_mongod() if args.spawn_mongod else (None, None, args.uri)
+    try:
+        report = asyncio.run(run(args, uri))
+    finally:
+        if mongod:
+            mongod.terminate()
+            mongod.wait(timeout=30)
+            shutil.rmtree(dbpath, ignore_errors=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            report["comparison"] = compare(report, json.load(f))
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+import uuid
+import pytest
+
+# Settings are read at import time; the tests never talk to Google or Cloudinary
+os.environ.setdefault("MONGODB_URI", os.environ.get("MONGODB_TEST_URI", "mongodb://localhost:27017/chat_test"))
+os.environ.setdefault("JWT_SECRET", "test-secret")
+os.environ.setdefault("SESSION_SECRET", "test-secret")
+os.environ.setdefault("GOOGLE_CLIENT_ID", "unused")
+os.environ.setdefault("GOOGLE_CLIENT_SECRET", "unused")
+os.environ.setdefault("GOOGLE_CALLBACK_URL", "http://localhost/unused")
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from app.db.database import db_instance
+
+@pytest.fixture(scope="session")
+def mongo_uri():
+    """
+    MONGODB_TEST_URI if set; otherwise a mongod from PATH started for the session
+    in a temporary directory, so the Mongo tests run wherever mongod is installed.
+    """
+    uri = os.environ.get("MONGODB_TEST_URI")
+    if uri:
+        yield uri
+        return
+    if not shutil.which("mongod"):
+        pytest.skip("install mongod or set MONGODB_TEST_URI to run tests against a real mongod")
+    dbpath = tempfile.mkdtemp(prefix="chat-test-")
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    proc = subprocess.Popen(
+        ["mongod", "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+        stdout=subprocess.DEVNULL,
+    )
+    uri = f"mongodb://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            if proc.poll() is not None:
+                pytest.fail(f"mongod exited with status {proc.returncode}")
+            try:
+                with MongoClient(uri, serverSelectionTimeoutMS=500) as client:
+                    client.admin.command("ping")
+                break
+            except PyMongoError:
+                if time.monotonic() > deadline:
+                    pytest.fail("mongod did not come up in time")
+        yield uri
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+        shutil.rmtree(dbpath, ignore_errors=True)
+
+@pytest.fixture
+async def mongo_db(mongo_uri):
+    """
+    A throwaway database on the session's mongod (see mongo_uri), also installed
+    as the app's database so code calling get_db() uses it.
+    """
+    client = AsyncIOMotorClient(mongo_uri, serverSelectionTimeoutMS=5000)
+    db = client[f"chat_test_{uuid.uuid4().hex[:12]}"]
+    previous = db_instance.client, db_instance.db
+    db_instance.client, db_instance.db = client, db
+    try:
+        yield db
+    finally:
+        db_instance.client, db_instance.db = previous
+        await client.drop_database(db.name)
+        client.close()
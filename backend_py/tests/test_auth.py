@@ -0,0 +1,38 @@
+import httpx
+import pytest
+from bson import ObjectId
+from app.api.routes.auth import insert_google_user
+from app.db.indexes import create_indexes, INDEXES
+from app.db.user_index import user_index
+from app.main import app
+
+@pytest.fixture
+async def users(mongo_db):
+    await create_indexes(mongo_db, [s for s in INDEXES if s.collection == "users"])
+    # Warmed before the other "worker" creates its user, so this process has a stale "no"
+    await user_index.warm(mongo_db)
+    await mongo_db["users"].insert_one({"username": "taken", "usernameLower": "taken", "email": "taken@example.com"})
+    return mongo_db["users"]
+
+def client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+async def test_signup_rejects_names_this_worker_has_not_seen(users):
+    async with client() as c:
+        res = await c.post("/api/auth/signup", json={"username": "taken", "email": "new@example.com", "password": "secret1"})
+        assert res.status_code == 400
+        res = await c.post("/api/auth/signup", json={"username": "fresh", "email": "taken@example.com", "password": "secret1"})
+        assert res.status_code == 400
+    assert await users.count_documents({}) == 1
+
+async def test_google_signup_suffixes_a_name_taken_after_the_check(users):
+    new_user = {"username": "taken", "usernameLower": "taken", "email": "taken@gmail.com", "googleId": "1234567890"}
+    user_id = await insert_google_user(users.database, new_user, "1234567890")
+    created = await users.find_one({"_id": user_id})
+    assert created["username"] == "taken_12345" and created["usernameLower"] == "taken_12345"
+
+async def test_google_signup_still_fails_on_a_taken_email(users):
+    from pymongo.errors import DuplicateKeyError
+    new_user = {"_id": ObjectId(), "username": "other", "usernameLower": "other", "email": "taken@example.com", "googleId": "999"}
+    with pytest.raises(DuplicateKeyError):
+        await insert_google_user(users.database, new_user, "999")
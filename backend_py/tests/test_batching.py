@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from app.db.batching import MessageWriteBatcher
+from app.utils.conversation import conversation_id
+
+ALICE, BOB = ObjectId(), ObjectId()
+
+def message(text: str, at: datetime, **extra) -> dict:
+    return {
+        "conversationId": conversation_id(ALICE, BOB), "participants": [ALICE, BOB],
+        "senderId": ALICE, "receiverId": BOB, "text": text, "image": None, "createdAt": at, **extra,
+    }
+
+@pytest.fixture
+def flushed(monkeypatch):
+    """Sizes of the batches handed to _flush, in order."""
+    sizes = []
+    original = MessageWriteBatcher._flush
+    async def spy(self, batch):
+        sizes.append(len(batch))
+        await original(self, batch)
+    monkeypatch.setattr(MessageWriteBatcher, "_flush", spy)
+    return sizes
+
+async def test_concurrent_inserts_share_one_flush(mongo_db, flushed):
+    batcher = MessageWriteBatcher(lambda: mongo_db, window_seconds=0.05, max_batch=100)
+    start = datetime(2024, 5, 1)
+    docs = [message(str(i), start + timedelta(seconds=i)) for i in range(5)]
+    ids = await asyncio.gather(*(batcher.insert(d) for d in docs))
+    assert flushed == [5]
+    assert ids == [d["_id"] for d in docs]
+    assert await mongo_db["messages"].count_documents({}) == 5
+
+    summary = await mongo_db["conversations"].find_one({"_id": conversation_id(ALICE, BOB)})
+    assert summary["lastMessage"]["_id"] == docs[-1]["_id"]
+    assert summary["unread"][str(BOB)] == 5
+    # One search entry per participant
+    assert await mongo_db["message_search"].count_documents({}) == 10
+
+async def test_full_batch_flushes_before_the_window(mongo_db, flushed):
+    batcher = MessageWriteBatcher(lambda: mongo_db, window_seconds=60, max_batch=3)
+    now = datetime.utcnow()
+    await asyncio.wait_for(asyncio.gather(*(batcher.insert(message(str(i), now)) for i in range(3))), timeout=5)
+    assert flushed == [3]
+
+async def test_failed_documents_only_fail_their_own_sender(mongo_db):
+    existing = ObjectId()
+    await mongo_db["messages"].insert_one({"_id": existing})
+    batcher = MessageWriteBatcher(lambda: mongo_db, window_seconds=0.01, max_batch=100)
+    now = datetime.utcnow()
+    ok, duplicate = await asyncio.gather(
+        batcher.insert(message("ok", now)),
+        batcher.insert(message("dup", now, _id=existing)),
+        return_exceptions=True,
+    )
+    assert isinstance(ok, ObjectId)
+    assert isinstance(duplicate, RuntimeError)
+    assert await mongo_db["message_search"].count_documents({"messageId": existing}) == 0
+
+async def test_close_flushes_queued_messages(mongo_db):
+    batcher = MessageWriteBatcher(lambda: mongo_db, window_seconds=60, max_batch=100)
+    pending = asyncio.create_task(batcher.insert(message("late", datetime.utcnow())))
+    await asyncio.sleep(0)
+    await batcher.close()
+    assert isinstance(await pending, ObjectId)
+    assert await mongo_db["messages"].count_documents({"text": "late"}) == 1
@@ -0,0 +1,53 @@
+import asyncio
+from bson import ObjectId
+from app.api import deps
+from app.utils.cache import TTLCache
+from app.utils.instrumentation import cache_entries, cache_hits, cache_misses, observe_caches
+
+def test_set_is_skipped_when_an_invalidation_raced_the_load():
+    cache = TTLCache(10, 60)
+    generation = cache.generation
+    cache.invalidate("alice")
+    cache.set("alice", {"username": "old"}, generation=generation)
+    assert cache.get("alice") is None
+    cache.set("alice", {"username": "new"}, generation=cache.generation)
+    assert cache.get("alice") == {"username": "new"}
+
+class SlowUsers:
+    """find_one that lets another coroutine run before answering with what it read first."""
+
+    def __init__(self, user: dict):
+        self.user = user
+
+    async def find_one(self, *args, **kwargs):
+        snapshot = dict(self.user)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return snapshot
+
+async def test_get_current_user_does_not_cache_a_lookup_that_raced_an_invalidation(monkeypatch):
+    user_id = ObjectId()
+    users = SlowUsers({"_id": user_id, "username": "old"})
+    monkeypatch.setattr(deps, "resolve_token", lambda token: str(user_id))
+    monkeypatch.setattr(deps, "user_cache", TTLCache(10, 60))
+    request = type("R", (), {"cookies": {"jwt": "token"}})()
+
+    async def rename():
+        await asyncio.sleep(0)
+        users.user["username"] = "new"
+        deps.invalidate_user(user_id)
+
+    stale, _ = await asyncio.gather(deps.get_current_user(request, {"users": users}), rename())
+    assert stale["username"] == "old"
+    assert deps.user_cache.get(str(user_id)) is None
+    assert (await deps.get_current_user(request, {"users": users}))["username"] == "new"
+
+def test_cache_stats_are_exported_as_gauges():
+    cache = TTLCache(10, 60)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    observe_caches({"test": cache})
+    assert cache_entries._values[("test",)] == 1
+    assert cache_hits._values[("test",)] == 1
+    assert cache_misses._values[("test",)] == 1
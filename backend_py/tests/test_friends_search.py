@@ -0,0 +1,31 @@
+import httpx
+import pytest
+from bson import ObjectId
+from app.api.deps import get_current_user
+from app.main import app
+
+USER = {"_id": ObjectId(), "username": "alice", "email": "alice@example.com"}
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[get_current_user] = lambda: dict(USER)
+    yield httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    app.dependency_overrides.pop(get_current_user, None)
+
+async def test_blank_query_is_rejected(client):
+    async with client as c:
+        res = await c.get("/api/friends/search", params={"q": "   "})
+    assert res.status_code == 400
+
+async def test_prefix_matches_case_insensitively_and_pages(mongo_db, client):
+    await mongo_db["users"].insert_many([
+        {"username": name, "usernameLower": name.lower(), "profilePic": ""}
+        for name in ("Bobby", "bob", "bobcat", "carol")
+    ] + [{"_id": USER["_id"], "username": "alice", "usernameLower": "alice"}])
+    async with client as c:
+        first = (await c.get("/api/friends/search", params={"q": " BOB", "limit": 2})).json()
+        second = (await c.get("/api/friends/search", params={"q": " BOB", "limit": 2, "cursor": first["next"]})).json()
+    names = [u["username"] for u in first["users"] + second["users"]]
+    assert sorted(names, key=str.lower) == names
+    assert set(names) == {"Bobby", "bob", "bobcat"}
+    assert second["next"] is None
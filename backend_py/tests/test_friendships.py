@@ -0,0 +1,107 @@
+import asyncio
+from bson import ObjectId
+from app.db import friendships
+from app.db.indexes import ensure_indexes
+
+CONSISTENT = {
+    (None, None),
+    (friendships.OUTGOING, friendships.INCOMING),
+    (friendships.INCOMING, friendships.OUTGOING),
+    (friendships.FRIEND, friendships.FRIEND),
+}
+
+async def pair(db, a, b):
+    return await friendships.get_state(db, a, b), await friendships.get_state(db, b, a)
+
+async def setup(db):
+    await ensure_indexes(db, collections=["friendships"])
+    return ObjectId(), ObjectId()
+
+async def test_request_accept_and_remove(mongo_db):
+    alice, bob = await setup(mongo_db)
+    assert await friendships.send_request(mongo_db, alice, bob) is None
+    assert await pair(mongo_db, alice, bob) == (friendships.OUTGOING, friendships.INCOMING)
+    assert await friendships.send_request(mongo_db, alice, bob) == friendships.OUTGOING
+    assert await friendships.send_request(mongo_db, bob, alice) == friendships.INCOMING
+
+    assert await friendships.accept_request(mongo_db, bob, alice)
+    assert await pair(mongo_db, alice, bob) == (friendships.FRIEND, friendships.FRIEND)
+    assert not await friendships.accept_request(mongo_db, bob, alice)
+    assert await friendships.send_request(mongo_db, alice, bob) == friendships.FRIEND
+
+    assert await friendships.remove_friend(mongo_db, alice, bob)
+    assert await pair(mongo_db, alice, bob) == (None, None)
+    assert not await friendships.remove_friend(mongo_db, alice, bob)
+
+async def test_reject_only_applies_to_the_receiver(mongo_db):
+    alice, bob = await setup(mongo_db)
+    await friendships.send_request(mongo_db, alice, bob)
+    assert not await friendships.reject_request(mongo_db, alice, bob)
+    assert await pair(mongo_db, alice, bob) == (friendships.OUTGOING, friendships.INCOMING)
+    assert await friendships.reject_request(mongo_db, bob, alice)
+    assert await pair(mongo_db, alice, bob) == (None, None)
+
+async def test_concurrent_accept_and_reject_have_one_winner(mongo_db):
+    for _ in range(10):
+        alice, bob = ObjectId(), ObjectId()
+        await ensure_indexes(mongo_db, collections=["friendships"])
+        await friendships.send_request(mongo_db, alice, bob)
+        accepted, rejected = await asyncio.gather(
+            friendships.accept_request(mongo_db, bob, alice),
+            friendships.reject_request(mongo_db, bob, alice),
+        )
+        # If each only got one edge both back off and the request stays pending
+        assert not (accepted and rejected)
+        if accepted:
+            expected = (friendships.FRIEND, friendships.FRIEND)
+        elif rejected:
+            expected = (None, None)
+        else:
+            expected = (friendships.OUTGOING, friendships.INCOMING)
+        assert await pair(mongo_db, alice, bob) == expected
+
+async def test_crossed_requests_leave_a_consistent_pair(mongo_db):
+    for _ in range(10):
+        alice, bob = await setup(mongo_db)
+        results = await asyncio.gather(
+            friendships.send_request(mongo_db, alice, bob),
+            friendships.send_request(mongo_db, bob, alice),
+        )
+        # Exactly one wins, or each got one edge and both back off
+        assert results.count(None) <= 1
+        state = await pair(mongo_db, alice, bob)
+        assert state in CONSISTENT
+        assert (state == (None, None)) == (None not in results)
+
+async def test_double_accept_succeeds_once(mongo_db):
+    alice, bob = await setup(mongo_db)
+    await friendships.send_request(mongo_db, alice, bob)
+    results = await asyncio.gather(*(friendships.accept_request(mongo_db, bob, alice) for _ in range(5)))
+    # Interleaved duplicates may each apply one edge; they then all report the friendship
+    assert True in results
+    assert await pair(mongo_db, alice, bob) == (friendships.FRIEND, friendships.FRIEND)
+
+async def test_undone_accept_restores_the_request(mongo_db):
+    alice, bob = await setup(mongo_db)
+    await friendships.send_request(mongo_db, alice, bob)
+    before = await mongo_db["friendships"].find_one({"owner": bob, "peer": alice})
+    # The sender withdrew on their side only, so accept can only apply to one edge
+    await mongo_db["friendships"].delete_one({"owner": alice, "peer": bob})
+    assert not await friendships.accept_request(mongo_db, bob, alice)
+    after = await mongo_db["friendships"].find_one({"owner": bob, "peer": alice})
+    assert after == before
+
+async def test_undone_reject_restores_the_edge_exactly(mongo_db, monkeypatch):
+    alice, bob = await setup(mongo_db)
+    await friendships.send_request(mongo_db, alice, bob)
+    before = await mongo_db["friendships"].find_one({"owner": alice, "peer": bob})
+    collection_class = type(mongo_db["friendships"])
+    original = collection_class.delete_many
+    async def racing_delete_many(self, *args, **kwargs):
+        # A racing accept changes the other edge between the read and the delete
+        await mongo_db["friendships"].update_one({"owner": bob, "peer": alice}, {"$set": {"state": friendships.FRIEND}})
+        return await original(self, *args, **kwargs)
+    monkeypatch.setattr(collection_class, "delete_many", racing_delete_many)
+    assert not await friendships.reject_request(mongo_db, bob, alice)
+    monkeypatch.undo()
+    assert await mongo_db["friendships"].find_one({"owner": alice, "peer": bob}) == before
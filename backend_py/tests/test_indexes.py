@@ -0,0 +1,51 @@
+import pytest
+from pymongo.errors import OperationFailure
+from app.db.indexes import INDEXES, IndexBuilder, IndexVerificationError, create_indexes, ensure_indexes, index_builder, missing_indexes, prepare_indexes
+
+class FailingCollection:
+    """create_index fails for every index, as when existing duplicates block a unique one."""
+
+    def __init__(self, attempted: list):
+        self.attempted = attempted
+
+    async def create_index(self, keys, name, **options):
+        self.attempted.append(name)
+        raise OperationFailure("E11000 duplicate key error", code=11000)
+
+class FailingDb:
+    def __init__(self):
+        self.attempted = []
+
+    def __getitem__(self, name):
+        return FailingCollection(self.attempted)
+
+async def test_failed_unique_index_build_raises_after_trying_every_index():
+    db = FailingDb()
+    with pytest.raises(IndexVerificationError, match="users.email_1"):
+        await create_indexes(db, INDEXES)
+    assert db.attempted == [s.name for s in INDEXES]
+
+async def test_failed_non_unique_index_build_is_only_logged():
+    db = FailingDb()
+    await create_indexes(db, [s for s in INDEXES if not s.options.get("unique")])
+
+async def test_startup_check_reports_without_building(mongo_db):
+    missing = await ensure_indexes(mongo_db, verify_only=True)
+    assert {s.name for s in missing} == {s.name for s in INDEXES}
+    assert {s.name for s in await missing_indexes(mongo_db)} == {s.name for s in INDEXES}
+
+async def test_background_builder_creates_missing_indexes(mongo_db):
+    builder = IndexBuilder()
+    builder.start(mongo_db, await missing_indexes(mongo_db))
+    await builder.wait()
+    assert await missing_indexes(mongo_db) == []
+    await builder.close()
+
+async def test_startup_refuses_to_run_without_unique_indexes(mongo_db):
+    with pytest.raises(IndexVerificationError):
+        await prepare_indexes(mongo_db, verify_only=True)
+
+async def test_startup_builds_unique_indexes_before_serving(mongo_db):
+    await prepare_indexes(mongo_db)
+    assert not [s for s in await missing_indexes(mongo_db) if s.options.get("unique")]
+    await index_builder.close()
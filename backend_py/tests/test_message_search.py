@@ -0,0 +1,29 @@
+from bson import ObjectId
+from app.db.indexes import ensure_indexes, missing_indexes, verify_query_plans
+from app.services import messages as message_service
+from app.services.search import search_messages
+
+async def test_indexes_build_and_messages_insert_on_a_fresh_database(mongo_db):
+    await ensure_indexes(mongo_db)
+    assert await missing_indexes(mongo_db) == []
+
+    alice, bob = ObjectId(), ObjectId()
+    sent = await message_service.store_and_push_message(mongo_db, alice, bob, "meet at the harbour tonight", False)
+    assert await mongo_db["messages"].count_documents({"_id": sent["_id"]}) == 1
+
+    await verify_query_plans(mongo_db)
+
+async def test_search_is_scoped_to_the_callers_messages(mongo_db):
+    await ensure_indexes(mongo_db)
+    alice, bob, carol = ObjectId(), ObjectId(), ObjectId()
+    sent = await message_service.store_and_push_message(mongo_db, alice, bob, "meet at the harbour tonight", False)
+    await message_service.store_and_push_message(mongo_db, carol, bob, "the harbour is closed", False)
+
+    for participant in (alice, bob):
+        page = await search_messages(mongo_db, participant, "harbour", None, 0, 10)
+        assert sent["_id"] in [hit["_id"] for hit in page["results"]]
+
+    alice_hits = (await search_messages(mongo_db, alice, "harbour", None, 0, 10))["results"]
+    assert [hit["_id"] for hit in alice_hits] == [sent["_id"]]
+    assert "harbour" in alice_hits[0]["snippet"]
+    assert (await search_messages(mongo_db, carol, "tonight", None, 0, 10))["results"] == []
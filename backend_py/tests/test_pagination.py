@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+import httpx
+import pytest
+from bson import ObjectId
+from app.api.deps import get_current_user
+from app.db import friendships
+from app.main import app
+from app.utils.conversation import conversation_id
+from app.utils.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, clamp_limit,
+    decode_cursor, decode_key_cursor, encode_cursor, encode_key_cursor,
+)
+
+def test_cursor_round_trips():
+    created_at, doc_id = datetime(2024, 5, 1, 12, 30, 15, 123000), ObjectId()
+    assert decode_cursor(encode_cursor(created_at, doc_id)) == (created_at, doc_id)
+    # Usernames may contain the separator; only the last one splits off the id
+    assert decode_key_cursor(encode_key_cursor("a|b", doc_id)) == ("a|b", doc_id)
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", encode_key_cursor("alice", ObjectId()), "////"])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+def test_clamp_limit():
+    assert clamp_limit(None) == clamp_limit(0) == clamp_limit(-5) == DEFAULT_PAGE_SIZE
+    assert clamp_limit(10_000) == MAX_PAGE_SIZE
+
+ME, OTHER = ObjectId(), ObjectId()
+BASE = datetime(2024, 5, 1, 12, 0, 0)
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[get_current_user] = lambda: {"_id": ME, "username": "me"}
+    yield httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    app.dependency_overrides.pop(get_current_user, None)
+
+async def insert_messages(db, count, start=0):
+    # Pairs share a timestamp so the _id tiebreak is exercised
+    docs = [
+        {"_id": ObjectId(), "conversationId": conversation_id(ME, OTHER), "senderId": ME, "receiverId": OTHER,
+         "text": str(i), "createdAt": BASE + timedelta(seconds=i // 2)}
+        for i in range(start, start + count)
+    ]
+    await db["messages"].insert_many(docs)
+    return sorted(docs, key=lambda d: (d["createdAt"], d["_id"]))
+
+async def test_message_history_pages_back_without_gaps_or_repeats(mongo_db, client):
+    docs = await insert_messages(mongo_db, 11)
+    seen, params = [], {"limit": 3}
+    async with client as c:
+        while True:
+            page = (await c.get(f"/api/messages/{OTHER}", params=params)).json()
+            seen = [m["_id"] for m in page["messages"]] + seen
+            if not page["before"]:
+                break
+            params = {"limit": 3, "before": page["before"]}
+    assert seen == [str(d["_id"]) for d in docs]
+
+async def test_after_cursor_returns_only_newer_messages(mongo_db, client):
+    await insert_messages(mongo_db, 4)
+    async with client as c:
+        latest = (await c.get(f"/api/messages/{OTHER}")).json()
+        newer = await insert_messages(mongo_db, 3, start=10)
+        caught_up = (await c.get(f"/api/messages/{OTHER}", params={"after": latest["after"]})).json()
+        idle = (await c.get(f"/api/messages/{OTHER}", params={"after": caught_up["after"]})).json()
+    assert [m["_id"] for m in caught_up["messages"]] == [str(d["_id"]) for d in newer]
+    assert idle["messages"] == [] and idle["after"] == caught_up["after"]
+
+async def test_list_peers_pages_through_every_edge(mongo_db):
+    peers = [ObjectId() for _ in range(7)]
+    await mongo_db["users"].insert_many([{"_id": p, "username": f"user{i}", "email": f"u{i}@example.com"} for i, p in enumerate(peers)])
+    await mongo_db["friendships"].insert_many([
+        {"owner": ME, "peer": p, "state": friendships.FRIEND, "createdAt": BASE + timedelta(seconds=i // 3)}
+        for i, p in enumerate(peers)
+    ])
+    seen, cursor = [], None
+    while True:
+        page = await friendships.list_peers(mongo_db, ME, friendships.FRIEND, cursor, 2)
+        seen += [u["_id"] for u in page["users"]]
+        cursor = page["next"]
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(peers) and len(seen) == len(peers)
+
+async def test_empty_chat_still_gets_a_sync_position(mongo_db, client):
+    async with client as c:
+        empty = (await c.get(f"/api/messages/{OTHER}")).json()
+        assert empty["messages"] == [] and empty["after"]
+        docs = await insert_messages(mongo_db, 2, start=0)
+        # Messages stamped with the current time, as if sent while the client was offline
+        for doc in docs:
+            await mongo_db["messages"].update_one({"_id": doc["_id"]}, {"$set": {"createdAt": datetime.utcnow(), "participants": [ME, OTHER]}})
+        synced = (await c.get("/api/messages/sync", params={"after": empty["after"]})).json()
+    assert {m["_id"] for m in synced["messages"]} == {str(d["_id"]) for d in docs}
+
+async def test_first_sync_without_history_starts_from_the_server_clock(mongo_db):
+    from app.services.messages import messages_since
+    start = await messages_since(mongo_db, ME, None, 10)
+    assert start["cursor"] is not None and start["messages"] == []
+    message = {"_id": ObjectId(), "participants": [ME, OTHER], "createdAt": datetime.utcnow(), "text": "hi"}
+    await mongo_db["messages"].insert_one(message)
+    caught_up = await messages_since(mongo_db, ME, start["cursor"], 10)
+    assert [m["_id"] for m in caught_up["messages"]] == [message["_id"]]
+
+def test_position_cursor_precedes_documents_at_that_time():
+    from app.utils.pagination import position_cursor
+    at = datetime(2024, 5, 1, 12, 0, 0)
+    created_at, doc_id = decode_cursor(position_cursor(at))
+    assert created_at == at and doc_id < ObjectId()
@@ -0,0 +1,67 @@
+import pytest
+from app.sockets.presence import RedisPresence
+
+fakeredis = pytest.importorskip("fakeredis")
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+def node(server, changed=None) -> RedisPresence:
+    presence = RedisPresence("redis://unused", ttl=30)
+    presence.redis = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    presence._remove = presence.redis.register_script(RedisPresence._REMOVE)
+    if changed is not None:
+        presence.on_changed = changed.extend
+    return presence
+
+async def test_nodes_share_presence(server):
+    a, b = node(server), node(server)
+    await a.beat()
+    await b.beat()
+    await a.add("alice", "sid-1")
+    await b.add("bob", "sid-2")
+    assert await a.filter_online(["alice", "bob", "carol"]) == {"alice", "bob"}
+    assert sorted(await b.online_users()) == ["alice", "bob"]
+    assert await b.remove("sid-2") == "bob"
+    assert not await a.is_online("bob")
+
+async def test_last_session_removal_deletes_the_count(server):
+    a = node(server)
+    await a.beat()
+    await a.add("alice", "tab-1")
+    await a.add("alice", "tab-2")
+    await a.remove("tab-1")
+    assert await a.redis.hget(a.node_key, "alice") == "1"
+    await a.remove("tab-2")
+    assert not await a.redis.hexists(a.node_key, "alice")
+    await a.add("alice", "tab-3")
+    assert await a.is_online("alice")
+
+async def test_lapsed_node_is_reaped_and_its_users_reported(server):
+    changed = []
+    crashed, survivor = node(server), node(server, changed)
+    await crashed.beat()
+    await survivor.beat()
+    await crashed.add("alice", "sid-1")
+    # The crashed node stops renewing; make its registration lapse
+    await survivor.redis.zadd(RedisPresence.NODES_KEY, {crashed.node_key: 0})
+    assert not await survivor.is_online("alice")
+
+    await survivor.beat()
+    assert changed == ["alice"]
+    assert not await survivor.redis.exists(crashed.node_key)
+    # Only one reaper handles a node
+    await node(server, changed).beat()
+    assert changed == ["alice"]
+
+async def test_stalled_node_republishes_after_being_reaped(server):
+    changed = []
+    stalled, other = node(server, changed), node(server)
+    await stalled.beat()
+    await stalled.add("alice", "sid-1")
+    await other.redis.zadd(RedisPresence.NODES_KEY, {stalled.node_key: 0})
+    await other.beat()
+    await stalled.beat()
+    assert await other.is_online("alice")
+    assert changed == ["alice"]
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from pymongo.errors import ConnectionFailure
+from app.db.conversations import record_message
+from app.sockets.receipts import ReadReceiptBuffer
+from app.utils.conversation import conversation_id
+
+READER, SENDER = ObjectId(), ObjectId()
+BASE = datetime(2024, 5, 1, 12, 0, 0)
+
+class Unavailable:
+    def __getitem__(self, name):
+        raise ConnectionFailure("mongod is down")
+
+async def test_failed_flush_keeps_the_acknowledgements():
+    emitted = []
+    async def emit(event, data, to):
+        emitted.append((event, to))
+    buffer = ReadReceiptBuffer(lambda: Unavailable(), emit, flush_interval_seconds=60)
+    buffer.ack(str(READER), str(SENDER), BASE)
+    with pytest.raises(ConnectionFailure):
+        await buffer.flush()
+    # A newer ack arriving meanwhile still wins the merge
+    buffer.ack(str(READER), str(SENDER), BASE + timedelta(seconds=1))
+    assert buffer._marks == {(str(READER), str(SENDER)): BASE + timedelta(seconds=1)}
+    assert emitted == []
+
+async def send(db, seconds: int) -> dict:
+    message = {
+        "_id": ObjectId(), "conversationId": conversation_id(READER, SENDER), "senderId": SENDER,
+        "receiverId": READER, "text": str(seconds), "createdAt": BASE + timedelta(seconds=seconds),
+    }
+    await db["messages"].insert_one(message)
+    await record_message(db, message)
+    return message
+
+async def test_unread_badge_counts_what_arrived_after_the_ack(mongo_db):
+    emitted = []
+    async def emit(event, data, to):
+        emitted.append((event, data, to))
+    buffer = ReadReceiptBuffer(lambda: mongo_db, emit, flush_interval_seconds=60)
+    first, second, third = [await send(mongo_db, i) for i in range(3)]
+    buffer.ack(str(READER), str(SENDER), second["createdAt"])
+    await send(mongo_db, 3)  # arrives before the flush
+    await buffer.flush()
+
+    summary = await mongo_db["conversations"].find_one({"_id": conversation_id(READER, SENDER)})
+    assert summary["unread"][str(READER)] == 2
+    assert summary["lastReadAt"][str(READER)] == second["createdAt"]
+    read = {m["_id"] async for m in mongo_db["messages"].find({"readAt": {"$ne": None}})}
+    assert read == {first["_id"], second["_id"]}
+    assert [(e, to) for e, _, to in emitted] == [("messagesRead", str(SENDER))]
+
+    # Reading the rest clears the badge; a stale ack afterwards changes nothing
+    buffer.ack(str(READER), str(SENDER), BASE + timedelta(seconds=3))
+    await buffer.flush()
+    buffer.ack(str(READER), str(SENDER), first["createdAt"])
+    await buffer.flush()
+    summary = await mongo_db["conversations"].find_one({"_id": conversation_id(READER, SENDER)})
+    assert summary["unread"][str(READER)] == 0
+    assert await mongo_db["messages"].count_documents({"readAt": None}) == 0
+    assert len(emitted) == 2
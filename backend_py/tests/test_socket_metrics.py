@@ -0,0 +1,14 @@
+from bson import ObjectId
+from socketio import packet
+from app.sockets.server import InstrumentedPacket
+from app.utils.instrumentation import socket_emit_bytes
+
+def test_event_packets_count_their_encoded_size_once():
+    before = socket_emit_bytes._values.get(("newMessage",), 0.0)
+    encoded = InstrumentedPacket(packet.EVENT, data=["newMessage", {"_id": ObjectId(), "text": "hi"}]).encode()
+    assert socket_emit_bytes._values[("newMessage",)] - before == len(encoded)
+
+def test_non_event_packets_are_not_counted():
+    snapshot = dict(socket_emit_bytes._values)
+    InstrumentedPacket(packet.CONNECT, data={"sid": "abc"}).encode()
+    assert socket_emit_bytes._values == snapshot
@@ -0,0 +1,60 @@
+import gzip
+import httpx
+import pytest
+from app.utils.static import IMMUTABLE, REVALIDATE, FrontendFiles
+
+INDEX = b"<!doctype html><div id=root></div>" * 40
+BUNDLE = b"console.log('app');" * 200
+
+@pytest.fixture
+def frontend(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "index.html").write_bytes(INDEX)
+    (tmp_path / "assets" / "index-abc123.js").write_bytes(BUNDLE)
+    (tmp_path / "assets" / "index-abc123.js.gz").write_bytes(gzip.compress(BUNDLE))
+    (tmp_path / "favicon.svg").write_bytes(b"<svg/>")
+    app = FrontendFiles(str(tmp_path))
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+async def test_unknown_api_paths_are_not_found(frontend):
+    async with frontend as c:
+        for method in ("GET", "POST", "DELETE"):
+            res = await c.request(method, "/api/messages/typo/route")
+            assert res.status_code == 404
+            assert res.json() == {"detail": "Not Found"}
+        assert (await c.get("/api")).status_code == 404
+
+async def test_spa_routes_get_index_from_memory(frontend):
+    async with frontend as c:
+        res = await c.get("/settings/profile", headers={"Accept-Encoding": "identity"})
+    assert res.status_code == 200
+    assert res.content == INDEX
+    assert res.headers["cache-control"] == REVALIDATE
+
+@pytest.mark.parametrize("path", ["/assets/index-old999.js", "/assets/chunk", "/robots.txt", "/settings/avatar.png"])
+async def test_missing_files_are_not_found(frontend, path):
+    async with frontend as c:
+        res = await c.get(path)
+    assert res.status_code == 404
+    assert res.content != INDEX
+
+async def test_fingerprinted_assets_are_precompressed_and_immutable(frontend):
+    async with frontend as c:
+        res = await c.get("/assets/index-abc123.js", headers={"Accept-Encoding": "gzip, br;q=0"})
+        assert res.headers["content-encoding"] == "gzip"
+        assert res.headers["cache-control"] == IMMUTABLE
+        assert res.content == BUNDLE  # httpx decodes the gzip body
+        etag = res.headers["etag"]
+
+        cached = await c.get("/assets/index-abc123.js", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        assert cached.status_code == 304
+
+        plain = await c.get("/assets/index-abc123.js", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+        assert plain.headers["etag"] != etag
+
+async def test_other_files_revalidate(frontend):
+    async with frontend as c:
+        res = await c.get("/favicon.svg")
+    assert res.status_code == 200
+    assert res.headers["cache-control"] == REVALIDATE
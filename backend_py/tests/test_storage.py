@@ -0,0 +1,60 @@
+import base64
+import io
+import pytest
+from app.core.config import settings
+from app.utils.storage import InvalidImage, LocalStorage, decode_data_uri, sniff_image_type
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg"><script>alert(1)</script></svg>'
+
+def data_uri(mime: str, data: bytes) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorage(str(tmp_path), "/uploads/")
+
+def stored_bytes(storage: LocalStorage, url: str) -> bytes:
+    assert url.startswith("/uploads/")
+    with open(f"{storage.directory}/{url.rsplit('/', 1)[-1]}", "rb") as f:
+        return f.read()
+
+def test_save_round_trips_a_data_uri(storage):
+    url = storage.save(data_uri("image/png", PNG))
+    assert url.endswith(".png")
+    assert stored_bytes(storage, url) == PNG
+
+def test_save_stream_round_trips_a_file(storage):
+    url = storage.save_stream(io.BytesIO(PNG))
+    assert url.endswith(".png")
+    assert stored_bytes(storage, url) == PNG
+
+@pytest.mark.parametrize("mime", ["image/png", "image/svg+xml", "text/html", ""])
+def test_non_raster_bytes_are_rejected_whatever_the_declared_type(storage, mime):
+    with pytest.raises(InvalidImage):
+        storage.save_stream(io.BytesIO(SVG))
+    with pytest.raises(InvalidImage):
+        storage.save(data_uri(mime, SVG))
+
+def test_the_declared_type_does_not_pick_the_extension(storage):
+    url = storage.save(data_uri("text/html", PNG))
+    assert url.endswith(".png")
+
+@pytest.mark.parametrize("head, mime", [
+    (b"\xff\xd8\xff\xe0" + b"\x00" * 8, "image/jpeg"),
+    (PNG[:12], "image/png"),
+    (b"GIF89a" + b"\x00" * 6, "image/gif"),
+    (b"RIFF\x00\x00\x00\x00WEBP", "image/webp"),
+])
+def test_sniff_image_type_recognises_raster_formats(head, mime):
+    assert sniff_image_type(head) == mime
+
+def test_oversized_data_uris_are_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "max_upload_bytes", 32)
+    with pytest.raises(InvalidImage):
+        decode_data_uri(data_uri("image/png", PNG))
+
+@pytest.mark.parametrize("uri", ["not a data uri", "data:image/png,abc", "data:image/png;base64,***"])
+def test_malformed_data_uris_are_rejected(uri):
+    with pytest.raises(InvalidImage):
+        decode_data_uri(uri)
@@ -0,0 +1,125 @@
+import httpx
+import pytest
+from bson import ObjectId
+from starlette.requests import Request
+from fastapi import HTTPException
+from app.api.deps import form_image, get_current_user, multipart_form
+from app.core.config import settings
+from app.main import app
+from app.utils.storage import get_storage
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+def multipart_request(files: dict, data: dict = None, chunked: bool = False) -> Request:
+    body = httpx.Request("POST", "http://test/", files=files, data=data)
+    content = body.read()
+    headers = {k.lower(): v for k, v in body.headers.items()}
+    chunks = [content]
+    if chunked:
+        # As sent with Transfer-Encoding: chunked, with no declared length
+        headers.pop("content-length")
+        chunks = [content[i:i + 16] for i in range(0, len(content), 16)]
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/",
+        "headers": [(k.encode(), v.encode()) for k, v in headers.items()],
+    }
+    async def receive():
+        chunk = chunks.pop(0)
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+    return Request(scope, receive)
+
+async def test_form_image_returns_the_uploaded_file():
+    form = await multipart_request({"image": ("photo.png", PNG, "image/png")}, {"text": "hi"}).form()
+    image = form_image(form, "image")
+    assert image is not None
+    assert image.content_type == "image/png"
+    assert await image.read() == PNG
+    assert form_image(form, "text") is None
+
+async def test_multipart_form_accepts_a_chunked_body():
+    forms = multipart_form(multipart_request({"image": ("photo.png", PNG, "image/png")}, chunked=True), {})
+    form = await forms.__anext__()
+    assert await form_image(form, "image").read() == PNG
+    await forms.aclose()
+
+async def test_multipart_form_caps_a_chunked_body_as_it_streams(monkeypatch):
+    monkeypatch.setattr(settings, "max_upload_bytes", 64)
+    request = multipart_request({"image": ("photo.png", PNG * 4, "image/png")}, chunked=True)
+    with pytest.raises(HTTPException) as e:
+        await multipart_form(request, {}).__anext__()
+    assert e.value.status_code == 413
+
+async def test_multipart_form_refuses_a_declared_length_over_the_cap(monkeypatch):
+    monkeypatch.setattr(settings, "max_upload_bytes", 64)
+    request = multipart_request({"image": ("photo.png", PNG * 4, "image/png")})
+    with pytest.raises(HTTPException) as e:
+        await multipart_form(request, {}).__anext__()
+    assert e.value.status_code == 413
+
+def client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+async def test_multipart_body_is_not_parsed_before_authentication(monkeypatch):
+    parsed = []
+    original = Request.form
+    def spy(self, *args, **kwargs):
+        parsed.append(True)
+        return original(self, *args, **kwargs)
+    monkeypatch.setattr(Request, "form", spy)
+
+    async with client() as c:
+        res = await c.post(f"/api/messages/send/{ObjectId()}/multipart", files={"image": ("photo.png", PNG, "image/png")})
+    assert res.status_code == 401
+    assert parsed == []
+
+@pytest.fixture
+def local_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "storage_backend", "local")
+    monkeypatch.setattr(settings, "local_storage_dir", str(tmp_path))
+    get_storage.cache_clear()
+    yield tmp_path
+    get_storage.cache_clear()
+
+@pytest.fixture
+def signed_in(mongo_db):
+    user = {"_id": ObjectId(), "username": "alice", "email": "alice@example.com"}
+    app.dependency_overrides[get_current_user] = lambda: dict(user)
+    yield user
+    app.dependency_overrides.pop(get_current_user, None)
+
+async def test_send_message_multipart_stores_the_image(mongo_db, signed_in, local_storage):
+    receiver = ObjectId()
+    async with client() as c:
+        res = await c.post(
+            f"/api/messages/send/{receiver}/multipart",
+            data={"text": "look"},
+            files={"image": ("photo.png", PNG, "image/png")},
+        )
+    assert res.status_code == 200, res.text
+    message = res.json()
+    assert message["image"] and not message["imagePending"]
+    stored = local_storage / message["image"].rsplit("/", 1)[-1]
+    assert stored.read_bytes() == PNG
+    doc = await mongo_db["messages"].find_one({"_id": ObjectId(message["_id"])})
+    assert doc["image"] == message["image"]
+
+async def test_send_message_multipart_rejects_a_non_image_before_storing(mongo_db, signed_in, local_storage):
+    svg = b'<svg xmlns="http://www.w3.org/2000/svg"></svg>'
+    async with client() as c:
+        res = await c.post(
+            f"/api/messages/send/{ObjectId()}/multipart",
+            data={"text": "look"},
+            files={"image": ("photo.png", svg, "image/png")},
+        )
+    assert res.status_code == 400
+    assert await mongo_db["messages"].count_documents({}) == 0
+    assert list(local_storage.iterdir()) == []
+
+async def test_update_profile_multipart_stores_the_picture(mongo_db, signed_in, local_storage):
+    await mongo_db["users"].insert_one(dict(signed_in))
+    async with client() as c:
+        res = await c.put("/api/auth/update-profile/multipart", files={"profilePic": ("me.png", PNG, "image/png")})
+    assert res.status_code == 200, res.text
+    assert res.json()["profilePic"].startswith(settings.local_storage_url)
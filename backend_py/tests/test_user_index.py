@@ -0,0 +1,31 @@
+from app.db.user_index import UserIndex
+
+async def test_warm_without_unique_indexes_falls_back_to_a_scan(mongo_db):
+    await mongo_db["users"].insert_many([{"username": "alice", "email": "alice@example.com"}, {"username": "bob", "email": "bob@example.com"}])
+    index = UserIndex(100, 0.01)
+    index.start(mongo_db)
+    await index._task
+    assert index.ready
+    assert index.may_have_username("alice") and index.may_have_email("bob@example.com")
+    assert not index.may_have_username("carol")
+    await index.close()
+
+async def test_warm_uses_unique_indexes_when_present(mongo_db):
+    await mongo_db["users"].create_index("username", unique=True)
+    await mongo_db["users"].create_index("email", unique=True)
+    await mongo_db["users"].insert_one({"username": "alice", "email": "alice@example.com"})
+    index = UserIndex(100, 0.01)
+    await index.warm(mongo_db)
+    assert index.ready and index.may_have_username("alice")
+
+async def test_fallback_pass_does_not_count_twice(mongo_db):
+    await mongo_db["users"].insert_many([{"username": f"user{i}", "email": f"u{i}@example.com"} for i in range(5)])
+    index = UserIndex(100, 0.01)
+    await index.warm(mongo_db)
+    assert index.usernames.count == 5 and index.emails.count == 5
+
+async def test_names_added_while_warming_survive_the_swap(mongo_db):
+    index = UserIndex(100, 0.01)
+    index.add("late", "late@example.com")
+    await index.warm(mongo_db)
+    assert index.may_have_username("late") and index.may_have_email("late@example.com")
@@ -0,0 +1,38 @@
+import asyncio
+import threading
+import pytest
+from app.utils.workers import BoundedWorkerPool, WorkerPoolSaturated
+
+@pytest.fixture
+def pool():
+    pool = BoundedWorkerPool("test", max_workers=1, max_queue=0)
+    yield pool
+    pool.shutdown()
+
+async def settle(pool: BoundedWorkerPool, in_flight: int) -> None:
+    for _ in range(100):
+        if pool.in_flight == in_flight:
+            return
+        await asyncio.sleep(0.01)
+    assert pool.in_flight == in_flight
+
+async def test_run_returns_the_result_and_frees_the_slot(pool):
+    assert await pool.run(sum, [1, 2, 3]) == 6
+    await settle(pool, 0)
+
+async def test_a_cancelled_call_holds_its_slot_until_the_thread_is_done(pool):
+    release = threading.Event()
+    task = asyncio.create_task(pool.run(release.wait))
+    try:
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The thread is still busy, so the pool must still count it
+        assert pool.in_flight == 1
+        with pytest.raises(WorkerPoolSaturated):
+            await pool.run(sum, [])
+    finally:
+        release.set()
+    await settle(pool, 0)
+    assert await pool.run(sum, [1]) == 1
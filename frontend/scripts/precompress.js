@@ -0,0 +1,35 @@
+// Writes .br and .gz siblings for every compressible file in dist/ so the
+// backend can serve them as-is instead of compressing on each request.
+import { readdirSync, readFileSync, statSync, writeFileSync } from "node:fs";
+import { join } from "node:path";
+import { brotliCompressSync, constants, gzipSync } from "node:zlib";
+
+const DIST = new URL("../dist/", import.meta.url).pathname;
+const COMPRESSIBLE = /\.(html|js|mjs|css|svg|json|txt|map|ico|webmanifest|xml|wasm)$/;
+const MIN_BYTES = 1024;
+
+const walk = (dir) =>
+    readdirSync(dir).flatMap((name) => {
+        const path = join(dir, name);
+        return statSync(path).isDirectory() ? walk(path) : [path];
+    });
+
+let count = 0;
+for (const file of walk(DIST)) {
+    if (!COMPRESSIBLE.test(file)) continue;
+    const data = readFileSync(file);
+    if (data.length < MIN_BYTES) continue;
+
+    const br = brotliCompressSync(data, {
+        params: {
+            [constants.BROTLI_PARAM_QUALITY]: constants.BROTLI_MAX_QUALITY,
+            [constants.BROTLI_PARAM_SIZE_HINT]: data.length,
+        },
+    });
+    const gz = gzipSync(data, { level: 9 });
+    // Only keep variants that actually save bytes
+    if (br.length < data.length) writeFileSync(`${file}.br`, br);
+    if (gz.length < data.length) writeFileSync(`${file}.gz`, gz);
+    count++;
+}
+console.log(`precompressed ${count} files in ${DIST}`);
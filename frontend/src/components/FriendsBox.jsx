@@ -8,11 +8,13 @@ const FriendsBox = () => {
         getFriends, users,
         getPendingRequests, pendingRequests,
         getSentRequests, sentRequests,
-        sendFriendRequest, acceptFriendRequest, rejectFriendRequest, removeFriend
+        sendFriendRequest, acceptFriendRequest, rejectFriendRequest, removeFriend,
+        searchUsers
     } = useChatStore();
 
     const [activeTab, setActiveTab] = useState('friends');
     const [identifier, setIdentifier] = useState('');
+    const [suggestions, setSuggestions] = useState([]);
 
     useEffect(() => {
         // Fetch all necessary data when the component mounts
@@ -21,6 +23,17 @@ const FriendsBox = () => {
         getSentRequests();
     }, [getFriends, getPendingRequests, getSentRequests]);
 
+    useEffect(() => {
+        // Debounced username autocomplete; emails are still matched exactly on submit
+        const q = identifier.trim();
+        if (!q || q.includes('@')) {
+            setSuggestions([]);
+            return;
+        }
+        const timer = setTimeout(async () => setSuggestions(await searchUsers(q)), 200);
+        return () => clearTimeout(timer);
+    }, [identifier, searchUsers]);
+
     const handleAddFriend = (e) => {
         e.preventDefault();
         if (identifier.trim()) {
@@ -95,7 +108,13 @@ const FriendsBox = () => {
                         className="input input-bordered w-full"
                         value={identifier}
                         onChange={(e) => setIdentifier(e.target.value)}
+                        list="friend-suggestions"
                     />
+                    <datalist id="friend-suggestions">
+                        {suggestions.filter(user => !user.state).map(user => (
+                            <option key={user._id} value={user.username} />
+                        ))}
+                    </datalist>
                     <button type="submit" className="btn btn-primary"><UserPlus /></button>
                 </form>
 
@@ -6,6 +6,7 @@ import toast from "react-hot-toast";
 const MessageInput = () => {
     const [text, setText] = useState("");
     const [imagePreview, setImagePreview] = useState(null);
+    const [imageFile, setImageFile] = useState(null);
     const fileInputRef = useRef(null);
     const { sendMessage } = useChatStore();
 
@@ -16,6 +17,7 @@ const MessageInput = () => {
             return;
         }
 
+        setImageFile(file);
         const reader = new FileReader();
         reader.onloadend = () => {
             setImagePreview(reader.result);
@@ -25,6 +27,7 @@ const MessageInput = () => {
 
     const removeImage = () => {
         setImagePreview(null);
+        setImageFile(null);
         if (fileInputRef.current) fileInputRef.current.value = "";
     };
 
@@ -35,11 +38,12 @@ const MessageInput = () => {
         try {
             await sendMessage({
                 text: text.trim(),
-                image: imagePreview,
+                imageFile,
             });
 
             setText("");
             setImagePreview(null);
+            setImageFile(null);
             if (fileInputRef.current) fileInputRef.current = "";
         } catch (error) {
             console.error("Failed to send message", error);
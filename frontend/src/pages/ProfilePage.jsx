@@ -132,16 +132,9 @@ const ProfilePage = () => {
 		const file = e.target.files[0];
 		if (!file) return;
 
-		const reader = new FileReader();
-		reader.readAsDataURL(file);
-
-		reader.onload = async () => {
-			const base64Image = reader.result;
-			setSelectedImg(base64Image);
-			// Let's call updateProfile from here
-			await updateProfile({ profilePic: base64Image });
-			// No need to call it again from the save button if you have one
-		};
+		// Preview locally and upload the file itself as multipart instead of a base64 string
+		setSelectedImg(URL.createObjectURL(file));
+		await updateProfile({ profilePicFile: file });
 	};
 
 	// --- Debounced Username Check ---
@@ -79,7 +79,15 @@ export const useAuthStore = create((set, get) => ({
         set({ isUpdatingProfile: true });
 
         try {
-            const res = await axiosInstance.put("/auth/update-profile", data);
+            let res;
+            if (data.profilePicFile) {
+                const form = new FormData();
+                if (data.username) form.append("username", data.username);
+                form.append("profilePic", data.profilePicFile);
+                res = await axiosInstance.put("/auth/update-profile/multipart", form);
+            } else {
+                res = await axiosInstance.put("/auth/update-profile", data);
+            }
             set({ authUser: res.data });
             toast.success("Profile updated successfully");
         } catch (error) {
@@ -94,17 +102,23 @@ export const useAuthStore = create((set, get) => ({
         const { authUser } = get();
         if (!authUser || get().socket?.connected) return;
 
+        // Authenticated server-side from the jwt cookie
         const socket = io(BASE_URL, {
-            query: {
-                userId: authUser._id,
-            },
+            withCredentials: true,
         });
         socket.connect();
         set({ socket: socket });
 
+        // Snapshot of online friends on connect, then incremental deltas
         socket.on("getOnlineUsers", (userIds) => {
             set({ onlineUsers: userIds })
         });
+        socket.on("presenceUpdate", ({ online, offline }) => {
+            const next = new Set(get().onlineUsers);
+            online.forEach((id) => next.add(id));
+            offline.forEach((id) => next.delete(id));
+            set({ onlineUsers: [...next] });
+        });
 
     },
 
@@ -3,9 +3,22 @@ import { create } from "zustand";
 import { axiosInstance } from "../lib/axios";
 import { useAuthStore } from "./useAuthStore";
 
+// The friend lists are cursor-paginated; follow `next` until the server says there is no more
+const fetchAllUsers = async (path) => {
+    const users = [];
+    let cursor = null;
+    do {
+        const res = await axiosInstance.get(path, { params: { limit: 200, ...(cursor && { cursor }) } });
+        users.push(...res.data.users);
+        cursor = res.data.next;
+    } while (cursor);
+    return users;
+};
 
 export const useChatStore = create((set, get) => ({
     messages:[],
+    olderMessagesCursor: null,
+    syncCursor: null,
     users: [],
     pendingRequests: [],
     sentRequests: [],
@@ -21,8 +34,7 @@ export const useChatStore = create((set, get) => ({
     getFriends: async () => {
         set({isUsersLoading: true});
         try {
-            const res = await axiosInstance.get("/friends/list");
-            set({ users: res.data});
+            set({ users: await fetchAllUsers("/friends/list") });
         } catch (error) {
             toast.error(error.response?.data?.message || "Failed to fetch friends");
         } finally {
@@ -31,8 +43,7 @@ export const useChatStore = create((set, get) => ({
     },
     getPendingRequests: async () => {
         try {
-            const res = await axiosInstance.get("/friends/requests/pending");
-            set({ pendingRequests: res.data });
+            set({ pendingRequests: await fetchAllUsers("/friends/requests/pending") });
         } catch (error) {
             toast.error(error.response?.data?.message || "Failed to fetch pending requests");
         }
@@ -40,13 +51,21 @@ export const useChatStore = create((set, get) => ({
 
     getSentRequests: async () => {
         try {
-            const res = await axiosInstance.get("/friends/requests/sent");
-            set({ sentRequests: res.data });
+            set({ sentRequests: await fetchAllUsers("/friends/requests/sent") });
         } catch (error) {
             toast.error(error.response?.data?.message || "Failed to fetch sent requests");
         }
     },
 
+    searchUsers: async (q) => {
+        try {
+            const res = await axiosInstance.get("/friends/search", { params: { q } });
+            return res.data.users;
+        } catch (error) {
+            return [];
+        }
+    },
+
     sendFriendRequest: async (identifier) => {
         try {
             const res = await axiosInstance.post("/friends/request/send", { identifier });
@@ -98,17 +117,73 @@ export const useChatStore = create((set, get) => ({
         set({isMessagesLoading: true});
         try {
             const res = await axiosInstance.get(`/messages/${userId}`);
-            set({messages: res.data});
+            set({messages: res.data.messages, olderMessagesCursor: res.data.before, syncCursor: res.data.after});
+            get().markConversationRead();
         } catch (error) {
             toast.error(error.response.data.message);
         } finally {
             set({isMessagesLoading: false});
         }
     },
+    // Acknowledge the newest message from the open chat; the server batches these
+    markConversationRead: () => {
+        const { selectedUser, messages } = get();
+        const socket = useAuthStore.getState().socket;
+        const lastReceived = [...messages].reverse().find((m) => m.senderId === selectedUser?._id);
+        if (!socket || !lastReceived || lastReceived.readAt) return;
+        socket.emit("markRead", { userId: selectedUser._id, readUpTo: lastReceived.createdAt });
+    },
+    // After a reconnect, fetch only what was sent while the socket was down
+    syncMissedMessages: async () => {
+        const { selectedUser, syncCursor } = get();
+        const socket = useAuthStore.getState().socket;
+        if (!selectedUser || !syncCursor || !socket) return;
+        const res = await socket.timeout(10000).emitWithAck("sync", { after: syncCursor });
+        if (res.error) return;
+        const known = new Set(get().messages.map((m) => m._id));
+        const missed = res.messages.filter((m) => !known.has(m._id) && m.participants.includes(selectedUser._id));
+        set({ messages: [...get().messages, ...missed], syncCursor: res.cursor });
+        if (res.hasMore) get().syncMissedMessages();
+    },
+    getOlderMessages: async () => {
+        const { selectedUser, olderMessagesCursor, messages } = get();
+        if (!selectedUser || !olderMessagesCursor) return;
+        try {
+            const res = await axiosInstance.get(`/messages/${selectedUser._id}`, {
+                params: { before: olderMessagesCursor },
+            });
+            set({
+                messages: [...res.data.messages, ...messages],
+                olderMessagesCursor: res.data.before,
+            });
+        } catch (error) {
+            toast.error(error.response.data.message);
+        }
+    },
     sendMessage: async (messageData) => {
         const {selectedUser, messages} = get();
         try {
-            const res = await axiosInstance.post(`/messages/send/${selectedUser._id}`, messageData);
+            let res;
+            if (messageData.imageFile) {
+                // Images go as multipart so they are streamed instead of base64-encoded in JSON
+                const form = new FormData();
+                form.append("text", messageData.text);
+                form.append("image", messageData.imageFile);
+                res = await axiosInstance.post(`/messages/send/${selectedUser._id}/multipart`, form);
+            } else {
+                const socket = useAuthStore.getState().socket;
+                if (socket?.connected) {
+                    // One hop over the open connection; the ack carries the stored message
+                    const ack = await socket.timeout(10000).emitWithAck("sendMessage", {
+                        receiverId: selectedUser._id,
+                        text: messageData.text,
+                    });
+                    if (ack.error) throw { response: { data: { message: ack.error } } };
+                    res = { data: ack.message };
+                } else {
+                    res = await axiosInstance.post(`/messages/send/${selectedUser._id}`, { text: messageData.text });
+                }
+            }
             set({messages : [...messages, res.data]});
         } catch (error){
             toast.error(error.response.data.message);
@@ -127,12 +202,38 @@ export const useChatStore = create((set, get) => ({
             set({
                 messages: [...get().messages, newMessage]
             })
+            get().markConversationRead();
+        })
+        socket.io.on("reconnect", get().syncMissedMessages)
+        socket.on("messagesRead", ({ reads }) => {
+            const read = reads.find((r) => r.userId === selectedUser._id);
+            if (!read) return;
+            set({
+                messages: get().messages.map((m) =>
+                    m.receiverId === read.userId && !m.readAt && m.createdAt <= read.readUpTo
+                        ? { ...m, readAt: read.readUpTo } : m)
+            })
+        })
+        // Images are uploaded after the message is delivered and patched in here
+        socket.on("imageReady", ({ _id, image }) => {
+            set({
+                messages: get().messages.map((m) => m._id === _id ? { ...m, image, imagePending: false } : m)
+            })
+        })
+        socket.on("imageFailed", ({ _id }) => {
+            set({
+                messages: get().messages.map((m) => m._id === _id ? { ...m, imagePending: false, imageFailed: true } : m)
+            })
         })
     },
 
     unsubscribeFromMessages: () => {
         const socket = useAuthStore.getState().socket;
         socket.off("newMessage");
+        socket.off("imageReady");
+        socket.off("imageFailed");
+        socket.off("messagesRead");
+        socket.io.off("reconnect");
     },
     
     setSelectedUser: (selectedUser) => set({selectedUser})